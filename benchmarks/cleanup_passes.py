@@ -0,0 +1,67 @@
+"""Per-event cost of the type-specific cleanup passes (tv_ass, tv_srt, web).
+
+Run from anywhere, e.g. ``python benchmarks/cleanup_passes.py -n 20000``, and compare the numbers
+between two checkouts. Full-width conversion and speaker assignment are part of the passes, so the
+numbers are end-to-end costs of the type-specific processing.
+"""
+import argparse
+import copy
+import logging
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from subs_refine.config import ProcessingConfig  # noqa: E402
+from subs_refine.processor import tv_ass_process, tv_srt_process, web_process  # noqa: E402
+from subs_refine.subtitle import Dialog, Events, Subtitle, Timecode  # noqa: E402
+from subs_refine.subtitle.types import Color, Position  # noqa: E402
+
+TV_ASS_LINES = ("（太郎）今日は　いい天気だね！そうだね", "♪～", "≫ニュースをお伝えします", "＜何だって！？＞",
+                "[外：0123456789ABCDEF0123456789ABCDEF]えっ？　本当に", "花子：うん　わかった→")
+TV_SRT_LINES = ("(拍手)　♪～ 今日は（笑）いい天気！本当に", "📱もしもし？　はい", "（太郎）　行くぞ！",
+                "≫ただいま　→おかえり", "⚟ドアの音　（足音）")
+WEB_LINES = ("<i>今日は</i>{\\an8}いい天気！そうだね", "〔音楽〕", "- （太郎）行くぞ！　- 待って", "(笑)本当に？はい",
+             "♪～ 歌詞の一節 ～♪", "〈ナレーション〉")
+
+
+def make_doc(lines: tuple[str, ...], count: int, positioned: bool) -> Subtitle:
+    doc = Subtitle()
+    doc.events = Events(
+        Dialog(Timecode(i * 1000), Timecode(i * 1000 + 900), lines[i % len(lines)],
+               pos=Position(480, 400 + 40 * (i % 2)) if positioned else None,
+               color=Color(255, 255, 255) if positioned else None)
+        for i in range(count))
+    return doc
+
+
+def run(process, doc: Subtitle, config: ProcessingConfig, repeat: int) -> float:
+    """Best time per event in microseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        work = copy.deepcopy(doc)
+        start = time.perf_counter()
+        process(work, config)
+        best = min(best, time.perf_counter() - start)
+    return best / len(doc.events) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--events", type=int, default=10000)
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    config = ProcessingConfig()
+    cases = (("tv_ass", tv_ass_process, TV_ASS_LINES, True),
+             ("tv_srt", tv_srt_process, TV_SRT_LINES, False),
+             ("web", web_process, WEB_LINES, False))
+    for name, process, lines, positioned in cases:
+        doc = make_doc(lines, args.events, positioned)
+        print(f"{name:7} {run(process, doc, config, args.repeat):8.2f} µs/event")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,71 @@
 import argparse
+import csv
+import json
 import logging
-from dataclasses import asdict
-from itertools import chain
-from pathlib import Path
-
-from subs_refine import SCRIPT_VERSION, Processor
-from subs_refine.config import ProcessingConfig, ConversionStrategy, OutputFormat, MergeStrategy
+import statistics
+import sys
+from collections.abc import Iterator
+from contextlib import nullcontext, redirect_stdout
+from dataclasses import asdict, dataclass, field
+from pathlib import Path, PurePosixPath
+
+from subs_refine import SCRIPT_VERSION, Processor, Subtitle
+from subs_refine.archive import ArchiveWriter, archive_stem, is_archive, iter_archive_members
+from subs_refine.batch import BACKENDS, MEMORY_PER_INPUT_BYTE, BatchRunner, CostModel, FileResult
+from subs_refine.config import (ProcessingConfig, ConversionStrategy, OutputFormat, MergeStrategy, RecurringAction,
+                                Compression)
+from subs_refine.discovery import DEFAULT_EXCLUDE, DEFAULT_INCLUDE, discover_files, is_up_to_date
+from subs_refine.fileio import atomic_write_bytes
+from subs_refine.jobqueue import JobQueue, run_workers
+from subs_refine.manifest import Manifest
+from subs_refine.recurring import RecurringIndex
+from subs_refine.sqlite_sink import SQLiteSink
+from subs_refine.subtitle import INPUT_SUFFIXES
+
+STDIN_PATH = Path("-")
+MB = 1024 * 1024
+
+
+@dataclass
+class RunOptions:
+    """How a run of :func:`process_paths` finds its inputs, what it skips and where results go."""
+    output_archive: Path | None = None  # Collect all outputs into this archive
+    null_data: bool = False  # NUL-separated documents on stdin/stdout
+    runner: BatchRunner | None = None  # Runs the files of process_files(), in-process by default
+    discovery: dict = field(default_factory=dict)  # Keyword arguments of discover_files()
+    update: bool = False  # Skip files whose output is up to date
+    config_mtime: float | None = None  # Outputs older than this are out of date with --update
+    manifest: Manifest | None = None  # Records completed inputs for --resume
+    resume: bool = False  # Skip files the manifest has recorded as complete
+    sink: SQLiteSink | None = None  # Receives the processed events with --sqlite
+    schedule_report: Path | None = None  # Predicted against actual processing time per file
+    memory_report: Path | None = None  # Peak allocations per file and phase
 
 
 def main():
     parser = argparse.ArgumentParser(description=f"SubsRefine {SCRIPT_VERSION} | Process Japanese subtitles")
     parser.add_argument("--conf", type=Path, default=Path(__file__).parent / "config.yaml",
                         help="Configuration file path")
-    parser.add_argument("path", nargs="+", type=Path, help="Input files/directories")
+    parser.add_argument("path", nargs="*", type=Path,
+                        help="Input files/directories/archives (zip, tar), or - to read from stdin and write to stdout")
+    parser.add_argument("-z", "--null-data", action="store_true",
+                        help="Treat stdin/stdout as a stream of documents separated by NUL bytes")
+    parser.add_argument("--output-archive", type=Path,
+                        help="Write all outputs into a single zip/tar archive instead of separate files")
     parser.add_argument("--verbose", action="store_true", help="Enable debug logging")
+    add_batch_arguments(parser)
+    add_queue_arguments(parser)
 
     add_config_arguments(parser)
     args = parser.parse_args()
+    if not args.path and not (args.queue and (args.work or args.retry_failed)):
+        parser.error("the following arguments are required: path")
+    if args.queue and STDIN_PATH in args.path:
+        parser.error("--queue cannot read from stdin")
+    if args.resume and not args.manifest:
+        parser.error("--resume requires --manifest")
+    if args.resume and args.output_archive:
+        parser.error("--resume cannot be combined with --output-archive")
 
     logger = logging.getLogger("subs_refine")
     logger.setLevel(logging.DEBUG)
@@ -26,9 +75,14 @@ def main():
     console_handler.setFormatter(formatter)
     logger.addHandler(console_handler)
 
-    config = ProcessingConfig.from_yaml(args.conf) if args.conf.exists() else ProcessingConfig()
-    override_dict = build_override_dict(args)
-    config = merge_config(config, override_dict)
+    try:
+        config = ProcessingConfig.from_yaml(args.conf) if args.conf.exists() else ProcessingConfig()
+        config = merge_config(config, build_override_dict(args))
+    except ValueError as e:
+        parser.error(str(e))
+    # An archive has no output file next to which the incremental sidecar could be kept
+    if config.incremental and args.output_archive:
+        parser.error("--incremental cannot be combined with --output-archive")
 
     if args.verbose:
         console_handler.setLevel(logging.DEBUG)
@@ -40,7 +94,48 @@ def main():
     else:
         console_handler.setLevel(logging.WARNING)
 
-    process_paths(args.path, config)
+    runner = BatchRunner(
+        config,
+        jobs=args.jobs,
+        max_inflight_bytes=args.max_inflight_mb * MB,
+        max_files_per_worker=args.recycle_after_files,
+        max_bytes_per_worker=args.recycle_after_mb * MB,
+        cost_model=args.cost_model,
+        estimate_costs=args.schedule_report is not None or args.memory_report is not None,
+        track_memory=args.memory_report is not None,
+        backend=args.backend,
+    )
+    discovery = {
+        "recursive": args.recursive,
+        "include": args.include or DEFAULT_INCLUDE,
+        "exclude": DEFAULT_EXCLUDE + tuple(args.exclude or ()),
+    }
+    if args.queue:
+        run_queue(args.queue, args.path, config, discovery, args.work, args.jobs, args.lease, args.max_attempts,
+                  args.retry_failed)
+        return
+
+    # Outputs older than the configuration may have been produced with different settings
+    config_mtime = args.conf.stat().st_mtime if args.update and args.conf.exists() else None
+
+    with (Manifest(args.manifest) if args.manifest else nullcontext() as manifest,
+          SQLiteSink(args.sqlite) if args.sqlite else nullcontext() as sink):
+        process_paths(args.path, config, RunOptions(
+            output_archive=args.output_archive,
+            null_data=args.null_data,
+            runner=runner,
+            discovery=discovery,
+            update=args.update,
+            config_mtime=config_mtime,
+            manifest=manifest,
+            resume=args.resume,
+            sink=sink,
+            schedule_report=args.schedule_report,
+            memory_report=args.memory_report,
+        ))
+    if sink is not None:
+        print(f"Database: loaded {sink.events} events of {sink.files} files into {sink.path}",
+              file=sys.stderr if STDIN_PATH in args.path else sys.stdout)
 
 
 def add_boolean_pair(parser, flag: str, dest: str, help_text: str = ""):
@@ -50,6 +145,82 @@ def add_boolean_pair(parser, flag: str, dest: str, help_text: str = ""):
                         help=f"Disable {help_text}".strip())
 
 
+def add_batch_arguments(parser):
+    parser.add_argument("--recursive", action="store_true", help="Search input directories recursively")
+    parser.add_argument("--include", action="append", metavar="PATTERN",
+                        help=f"Glob for files to process in directories, repeatable "
+                             f"(default: {' '.join(DEFAULT_INCLUDE)})")
+    parser.add_argument("--exclude", action="append", metavar="PATTERN",
+                        help=f"Glob for files or directories to skip, repeatable (always skipped: {' '.join(DEFAULT_EXCLUDE)})")
+    parser.add_argument("-u", "--update", action="store_true",
+                        help="Skip inputs whose output is newer than both the input and the configuration file")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of parallel jobs (default: 1, process in the main process)")
+    parser.add_argument("--backend", choices=BACKENDS, default="process",
+                        help="Run jobs in worker processes, or in threads sharing one processor "
+                             "(scales on free-threaded Python builds)")
+    parser.add_argument("--max-inflight-mb", type=int, default=0,
+                        help="Estimated memory budget for files processed at the same time, 0 for no limit")
+    parser.add_argument("--recycle-after-files", type=int, default=0,
+                        help="Replace a worker process after it has handled this many files")
+    parser.add_argument("--recycle-after-mb", type=int, default=0,
+                        help="Replace a worker process after it has read this many MB of input")
+    parser.add_argument("--cost-model", type=parse_cost_model, metavar="PER_FILE,PER_BYTE,PER_EVENT",
+                        help="Coefficients (in seconds) used to schedule the largest files first")
+    parser.add_argument("--schedule-report", type=Path,
+                        help="Write predicted and actual processing time per file to this CSV file")
+    parser.add_argument("--memory-report", type=Path,
+                        help="Trace peak memory per file for parsing, processing and saving, and write it to "
+                             "this CSV file (JSON if the name ends with .json)")
+    parser.add_argument("--manifest", type=Path,
+                        help="Journal file recording every completed input, its hash and its output")
+    parser.add_argument("--sqlite", type=Path, metavar="DATABASE",
+                        help="Also load the processed events of every file into this SQLite database")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip inputs the manifest records as completed and unchanged")
+
+
+def add_queue_arguments(parser):
+    parser.add_argument("--queue", type=Path, metavar="DATABASE",
+                        help="Job queue on shared storage: the given paths are queued instead of processed")
+    parser.add_argument("--work", action="store_true",
+                        help="Process jobs from --queue with --jobs worker processes until it is drained")
+    parser.add_argument("--lease", type=float, default=300,
+                        help="Seconds a worker may hold a job without renewing its lease (default: 300)")
+    parser.add_argument("--max-attempts", type=int, default=3,
+                        help="Attempts per queued file before it is marked failed (default: 3)")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Queue files that ran out of attempts again")
+
+
+def parse_cost_model(value: str) -> CostModel:
+    try:
+        return CostModel(*map(float, value.split(",")))
+    except (TypeError, ValueError):
+        raise argparse.ArgumentTypeError("expected three comma-separated numbers")
+
+
+def parse_time(value: str) -> int:
+    """``[[H:]M:]S[.fff]`` to milliseconds."""
+    seconds = 0.0
+    for part in value.split(":"):
+        seconds = seconds * 60 + float(part)
+    return round(seconds * 1000)
+
+
+def parse_time_range(value: str) -> dict:
+    start, separator, end = value.partition("-")
+    try:
+        if not separator:
+            raise ValueError
+        time_range = {"start": parse_time(start) if start else None, "end": parse_time(end) if end else None}
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected START-END such as 01:12:00-01:15:00; either side may be empty")
+    if time_range["start"] is not None and time_range["end"] is not None and time_range["end"] <= time_range["start"]:
+        raise argparse.ArgumentTypeError("the end of the range must come after its start")
+    return time_range
+
+
 def add_config_arguments(parser):
     # ProcessingConfig
     parser.add_argument(
@@ -68,7 +239,7 @@ def add_config_arguments(parser):
     parser.add_argument(
         "-f", "--output-format",
         type=OutputFormat, choices=list(OutputFormat),
-        help="Output file format (e.g., txt, srt, json)"
+        help="Output file format (e.g., txt, srt, jsonl)"
     )
     parser.add_argument(
         "-e", "--output-ending",
@@ -81,6 +252,17 @@ def add_config_arguments(parser):
         type=int,
         help="Show pause tip if pause exceeds this duration (in milliseconds)"
     )
+    parser.add_argument(
+        "--compress",
+        dest="output_compression", type=Compression, choices=list(Compression),
+        help="Compress output files (gz, bz2, xz)"
+    )
+    parser.add_argument(
+        "--align",
+        dest="align_with", metavar="TRACK",
+        help="Subtitle track (e.g. a translation) merged as a second line under the overlapping processed lines; "
+             "{dir} and {stem} are replaced by the directory and name of each input"
+    )
 
     # FullHalfConversion
     parser.add_argument(
@@ -111,6 +293,65 @@ def add_config_arguments(parser):
         help="Connector used between repeated syllables"
     )
 
+    # Deduplication
+    add_boolean_pair(parser, "d", "dedup_enabled", "collapsing of lines repeated by rolling captions")
+    parser.add_argument(
+        "--dedup-window",
+        type=int,
+        help="Number of preceding lines searched for a repeated line"
+    )
+    parser.add_argument(
+        "--dedup-tolerance",
+        type=int,
+        help="Maximum gap in milliseconds between a line and its repeat"
+    )
+
+    # Retiming
+    parser.add_argument(
+        "--retime-to",
+        dest="retime_reference", metavar="TRACK",
+        help="Reference track to shift timings to (requires numpy); "
+             "{dir} and {stem} are replaced by the directory and name of each input"
+    )
+    parser.add_argument(
+        "--retime-drift",
+        action="store_true", default=None,
+        help="Also correct a linear drift when retiming"
+    )
+    parser.add_argument(
+        "--retime-max-offset",
+        type=int,
+        help="Largest offset searched when retiming (in milliseconds)"
+    )
+
+    # RecurringBlocks
+    parser.add_argument(
+        "--recurring",
+        dest="recurring_action", type=RecurringAction, choices=list(RecurringAction),
+        help="What to do with line sequences (e.g. opening/ending lyrics) recurring across the input files"
+    )
+    parser.add_argument(
+        "--recurring-min-files",
+        type=int,
+        help="Number of input files a line sequence must occur in to count as recurring"
+    )
+
+    parser.add_argument(
+        "--range",
+        dest="time_range", type=parse_time_range, metavar="START-END",
+        help="Only process the lines shown in this part of each input, e.g. 01:12:00-01:15:00. "
+             "Uncompressed ass/srt/vtt files get a .timeindex.json sidecar so that only this part is parsed"
+    )
+    parser.add_argument(
+        "--text-cache-size",
+        type=int,
+        help="Number of processed lines memoized across files (0 to disable)"
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true", default=None,
+        help="Only reprocess parts of each file that changed since the previous run"
+    )
 
 
 def build_override_dict(args) -> dict:
@@ -125,6 +366,8 @@ def build_override_dict(args) -> dict:
         "output_ending": ["output", "ending"],
         "show_speaker": ["output", "show_speaker"],
         "show_pause_tip": ["output", "show_pause_tip"],
+        "output_compression": ["output", "compression"],
+        "align_with": ["output", "align_with"],
         "full_half_numbers": ["full_half_conversion", "numbers"],
         "full_half_letters": ["full_half_conversion", "letters"],
         "convert_half_katakana": ["full_half_conversion", "convert_half_katakana"],
@@ -132,6 +375,17 @@ def build_override_dict(args) -> dict:
         "cjk_space_char": ["cjk_spacing", "space_char"],
         "repetition_enabled": ["repetition_adjustment", "enabled"],
         "repetition_connector": ["repetition_adjustment", "connector"],
+        "dedup_enabled": ["deduplication", "enabled"],
+        "dedup_window": ["deduplication", "window"],
+        "dedup_tolerance": ["deduplication", "tolerance"],
+        "retime_reference": ["retiming", "reference"],
+        "retime_drift": ["retiming", "drift"],
+        "retime_max_offset": ["retiming", "max_offset"],
+        "recurring_action": ["recurring", "action"],
+        "recurring_min_files": ["recurring", "min_files"],
+        "time_range": ["time_range"],
+        "text_cache_size": ["text_cache_size"],
+        "incremental": ["incremental"],
     }
 
     for arg_name, path in mapping.items():
@@ -160,32 +414,297 @@ def merge_config(config: ProcessingConfig, override: dict) -> ProcessingConfig:
     return ProcessingConfig.from_dict(config_dict)
 
 
-def get_all_files_from_dir(paths: Path) -> list[Path]:
-    return [
-        path for path in chain(paths.glob("*.ass"), paths.glob("*.srt"), paths.glob("*.vtt"))
-        if path.is_file() and not path.stem.endswith("_processed")
-    ]
+def process_archive(processor: Processor, archive: Path, writer: ArchiveWriter | None = None,
+                    sink: SQLiteSink | None = None) -> None:
+    """Process the subtitle members of ``archive`` like files extracted into a directory named after it:
+    reference tracks are looked up and outputs written there, or into ``writer``."""
+    stem = archive_stem(archive)
+    output_dir = processor.config.output.dir or archive.parent
+    for name, data in iter_archive_members(archive, INPUT_SUFFIXES):
+        member = PurePosixPath(name)
+        print(f"  {member}")
+        try:
+            doc = Subtitle.from_bytes(data, member.suffix)
+            output_name = f"{stem}/{member.with_name(processor.output_filename(member))}"
+            input_path = archive.parent / stem / member
+            if writer is None:
+                output_path = output_dir / output_name
+                output_path.parent.mkdir(parents=True, exist_ok=True)
+                processor.process_for_output(doc, output_path)
+                doc = processor.attach_tracks(doc, input_path)
+                atomic_write_bytes(output_path, processor.serialize(doc))
+            else:
+                processor.process_subtitle(doc)
+                doc = processor.attach_tracks(doc, input_path)
+                writer.write(output_name, processor.serialize(doc))
+            if sink is not None:
+                sink.add(archive.resolve() / member, doc)
+        except Exception as e:
+            print(f"Failed: {e}")
 
 
-def process_paths(paths: list[Path], config: ProcessingConfig):
-    processor = Processor(config)
-    files = sorted(set(p for path in paths for p in (get_all_files_from_dir(path) if path.is_dir() else [path])))
+def iter_stdin_documents(stream, null_data: bool = False) -> Iterator[bytes]:
+    if not null_data:
+        yield stream.read()
+        return
+
+    pending = []
+    while chunk := stream.read1(65536):
+        *documents, rest = chunk.split(b"\0")
+        for document in documents:
+            pending.append(document)
+            yield b"".join(pending)
+            pending = []
+        pending.append(rest)
+    if any(pending):
+        yield b"".join(pending)
+
+
+def process_stdin(processor: Processor, null_data: bool = False) -> None:
+    stdout = sys.stdout.buffer
+    for data in iter_stdin_documents(sys.stdin.buffer, null_data):
+        try:
+            stdout.write(processor.process_bytes(data))
+        except Exception as e:
+            print(f"Failed: {e}", file=sys.stderr)
+        if null_data:
+            stdout.write(b"\0")
+        stdout.flush()
 
+
+def process_paths(paths: list[Path], config: ProcessingConfig, options: RunOptions | None = None):
+    options = options or RunOptions()
+    processor = Processor(config)
+    use_stdin = STDIN_PATH in paths
+    files = skip_output_collisions(processor, collect_files(paths, options.discovery),
+                                   archive=options.output_archive is not None)
+
+    if use_stdin:
+        process_stdin(processor, options.null_data)
+
+    # stdout carries the processed document in pipe mode, so progress goes to stderr
+    with redirect_stdout(sys.stderr) if use_stdin else nullcontext():
+        if config.recurring.action != RecurringAction.KEEP:
+            processor.recurring = build_recurring_index(files, config)
+            if options.runner is not None:
+                options.runner.recurring = processor.recurring
+        if options.update and options.output_archive is None:
+            output_dir = config.output.dir
+            remaining = [file for file in files if is_archive(file) or not is_up_to_date(
+                file, (output_dir or file.parent) / processor.output_filename(file), options.config_mtime or 0.0)]
+            if len(remaining) < len(files):
+                print(f"Skipping {len(files) - len(remaining)} up-to-date files")
+            files = remaining
+        if options.resume:
+            remaining = [file for file in files if not options.manifest.is_complete(file)]
+            if len(remaining) < len(files):
+                print(f"Skipping {len(files) - len(remaining)} files completed in a previous run")
+            files = remaining
+        worker_cache = process_files(processor, files, options,
+                                     quiet_if_empty=use_stdin or options.resume or options.update)
+        print_cache_stats(processor, *worker_cache)
+        processor.regex_rules.log_stats()
+
+
+def build_recurring_index(files: list[Path], config: ProcessingConfig) -> RecurringIndex:
+    """Read every input file once to find the line sequences recurring across them."""
+    settings = config.recurring
+
+    def documents():
+        for file in files:
+            if is_archive(file):
+                continue
+            try:
+                yield Subtitle.load(file)
+            except Exception as e:
+                print(f"Failed to index {file.name}: {e}")
+
+    index = RecurringIndex.build(documents(), settings.min_lines, settings.min_files)
+    print(f"Recurring blocks: {len(index)} sequences of {settings.min_lines} lines "
+          f"found in at least {settings.min_files} files")
+    return index
+
+
+def collect_files(paths: list[Path], discovery: dict | None = None) -> list[Path]:
+    return sorted(set(p for path in paths if path != STDIN_PATH
+                      for p in (discover_files(path, **(discovery or {})) if path.is_dir() else [path])))
+
+
+def skip_output_collisions(processor: Processor, files: list[Path], archive: bool = False) -> list[Path]:
+    """Drop files whose output would overwrite that of an earlier file, e.g. ``ep01.srt.gz`` next to
+    ``ep01.srt``. Outputs collected into an archive are keyed by name alone."""
+    output_dir = processor.config.output.dir
+    owners = {}
+    kept = []
+    for file in files:
+        if not is_archive(file):
+            name = processor.output_filename(file)
+            output = name if archive else (output_dir or file.parent) / name
+            if output in owners:
+                print(f"Skipping {file}: its output {name} would overwrite the one of {owners[output].name}")
+                continue
+            owners[output] = file
+        kept.append(file)
+    return kept
+
+
+def run_queue(queue_path: Path, paths: list[Path], config: ProcessingConfig, discovery: dict | None = None,
+              work: bool = False, jobs: int = 1, lease: float = 300, max_attempts: int = 3,
+              retry_failed: bool = False) -> None:
+    with JobQueue(queue_path, lease, max_attempts) as queue:
+        files = [file for file in skip_output_collisions(Processor(config), collect_files(paths, discovery))
+                 if not is_archive(file)]
+        if files or retry_failed:
+            added = queue.enqueue(files, retry_failed)
+            print(f"Queued {added} new of {len(files)} files")
+
+    if work:
+        run_workers(queue_path, config, jobs, lease, max_attempts)
+
+    with JobQueue(queue_path, lease, max_attempts) as queue:
+        counts = queue.counts()
+        print("Queue: " + ", ".join(f"{count} {state}" for state, count in counts.items()))
+        if work:
+            for path, error in queue.failures():
+                print(f"Failed: {error}")
+
+
+def print_cache_stats(processor: Processor, worker_hits: int = 0, worker_misses: int = 0) -> None:
+    info = processor.text_cache_info()
+    hits = info.hits + worker_hits
+    lookups = hits + info.misses + worker_misses
+    if lookups and info.maxsize:
+        print(f"Text cache: {hits}/{lookups} lines reused ({hits / lookups:.1%})")
+
+
+def process_files(processor: Processor, files: list[Path], options: RunOptions | None = None,
+                  quiet_if_empty: bool = False) -> tuple[int, int]:
+    """Process files and archives. Returns text cache hits and misses of worker processes."""
+    options = options or RunOptions()
+    manifest, sink = options.manifest, options.sink
+    schedule_report, memory_report = options.schedule_report, options.memory_report
     total = len(files)
     if total == 0:
-        print("No files found to process.")
-        return
+        if not quiet_if_empty:
+            print("No files found to process.")
+        return 0, 0
 
     total_files_width = len(str(total))
     processed_count = 0
+    worker_hits = worker_misses = 0
+    results = []
+
+    writer = ArchiveWriter(options.output_archive) if options.output_archive else None
+    runner = options.runner or BatchRunner(processor.config)
+    runner.collect = writer is not None
+    runner.digest = manifest is not None
+    runner.collect_events = sink is not None
+    try:
+        for result in runner.run((file for file in files if not is_archive(file)), processor):
+            processed_count += 1
+            print(f"\rProcessing: [{processed_count:0{total_files_width}}/{total}] {result.path.name}")
+            if result.error is not None:
+                print(f"Failed: {result.error}")
+            else:
+                if result.content is not None:
+                    writer.write(result.name, result.content)
+                if sink is not None:
+                    sink.add_rows(result.path.resolve(), result.events)
+                    result.events = None
+                if manifest is not None:
+                    manifest.record(result.path, result.output, result.sha256)
+            if runner.jobs > 1:
+                worker_hits += result.cache_hits
+                worker_misses += result.cache_misses
+            if schedule_report is not None or memory_report is not None:
+                result.content = None
+                results.append(result)
+
+        # Archive members are streamed, so archives are handled in this process
+        for file in files:
+            if not is_archive(file):
+                continue
+            processed_count += 1
+            print(f"\rProcessing: [{processed_count:0{total_files_width}}/{total}] {file.name}")
+            try:
+                process_archive(processor, file, writer, sink)
+            except Exception as e:
+                print(f"Failed: {e}")
+            else:
+                if manifest is not None:
+                    manifest.record(file)
+    except BaseException:
+        # Keep the previous archive rather than replacing it with a truncated one
+        if writer is not None:
+            writer.abort()
+        raise
+    if writer is not None:
+        writer.close()
+
+    if schedule_report is not None:
+        write_schedule_report(schedule_report, results)
+    if memory_report is not None:
+        write_memory_report(memory_report, results)
+    return worker_hits, worker_misses
+
+
+def write_schedule_report(path: Path, results: list[FileResult]) -> None:
+    rows = [result for result in results if result.cost is not None and result.error is None]
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(("path", "bytes", "events", "predicted_seconds", "actual_seconds"))
+        for result in rows:
+            writer.writerow((result.path, result.cost.size, result.cost.events,
+                             f"{result.cost.predicted:.6f}", f"{result.elapsed:.6f}"))
+
+    predicted = sum(result.cost.predicted for result in rows)
+    actual = sum(result.elapsed for result in rows)
+    print(f"Schedule report: predicted {predicted:.2f}s, actual {actual:.2f}s of processing time")
+    try:
+        model = CostModel.fit((result.cost.size, result.cost.events, result.elapsed) for result in rows)
+    except ValueError:
+        return
+    print(f"Fitted cost model: --cost-model {model.per_file:.3g},{model.per_byte:.3g},{model.per_event:.3g}")
+
+
+def write_memory_report(path: Path, results: list[FileResult]) -> None:
+    rows = [{
+        "path": str(result.path),
+        "bytes": result.input_bytes,
+        "raw_bytes": result.memory.raw_bytes,
+        "events_in": result.memory.events_in,
+        "events_out": result.memory.events_out,
+        "parse_peak": result.memory.parse,
+        "process_peak": result.memory.process,
+        "save_peak": result.memory.save,
+        "bytes_per_event": round(result.memory.bytes_per_event, 1),
+        "bytes_per_input_byte": (round(result.memory.peak / result.memory.raw_bytes, 2)
+                                 if result.memory.raw_bytes else 0),
+    } for result in results if result.memory is not None and result.error is None]
+
+    if path.suffix == ".json":
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+    else:
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=tuple(rows[0]) if rows else ("path",))
+            writer.writeheader()
+            writer.writerows(rows)
 
-    for file in files:
-        processed_count += 1
-        print(f"\rProcessing: [{processed_count:0{total_files_width}}/{total}] {file.name}")
-        try:
-            processor(file)
-        except Exception as e:
-            print(f"Failed: {e}")
+    if not rows:
+        return
+    largest = max(rows, key=lambda row: max(row["parse_peak"], row["process_peak"], row["save_peak"]))
+    largest_peak = max(largest["parse_peak"], largest["process_peak"], largest["save_peak"])
+    print(f"Memory report: largest peak {largest_peak / MB:.1f} MB for {largest['path']}")
+    for phase in ("parse", "process", "save"):
+        print(f"  {phase}: max {max(row[f'{phase}_peak'] for row in rows) / MB:.1f} MB")
+    ratios = [row["bytes_per_input_byte"] for row in rows if row["raw_bytes"]]
+    if ratios:
+        print(f"  peak per decompressed input byte: median {statistics.median(ratios):.1f}, max {max(ratios):.1f} "
+              f"(batch memory budget assumes {MEMORY_PER_INPUT_BYTE})")
+    per_event = [row["bytes_per_event"] for row in rows if row["events_in"]]
+    if per_event:
+        print(f"  peak per event: median {statistics.median(per_event):.0f} bytes")
 
 
 if __name__ == "__main__":
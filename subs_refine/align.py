@@ -0,0 +1,124 @@
+import heapq
+import logging
+from collections.abc import Iterator, Sequence
+
+from .subtitle import Subtitle, Events, Dialog
+
+__all__ = (
+    "IntervalIndex",
+    "align_events",
+    "align",
+)
+
+logger = logging.getLogger(__name__)
+
+
+class IntervalIndex:
+    """Event intervals ordered by start time, for sweep-line overlap joins."""
+
+    def __init__(self, events: Sequence[Dialog]):
+        self.starts = [int(event.start) for event in events]
+        self.ends = [int(event.end) for event in events]
+        self.order = sorted(range(len(events)), key=self.starts.__getitem__)
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def join(self, other: "IntervalIndex") -> Iterator[tuple[int, int, int]]:
+        """Yield ``(i, j, overlap)`` for every pair of intervals overlapping by ``overlap`` > 0 ms,
+        ``i`` indexing this index's events and ``j`` the other's.
+
+        Both sides are merged into one sweep in start order. Each side keeps the intervals that have
+        started in a heap keyed by their end, and drops those that ended before the current start, so an
+        interval is only compared with intervals of the other side that are live at its start: every
+        comparison yields a pair, and the join runs in O((n + m) log(n + m) + pairs).
+        """
+        starts, ends, order = self.starts, self.ends, self.order
+        other_starts, other_ends, other_order = other.starts, other.ends, other.order
+        active: list[tuple[int, int]] = []  # (end, i) of this side's started intervals
+        other_active: list[tuple[int, int]] = []  # (end, j)
+        a = b = 0
+        while a < len(order) or b < len(other_order):
+            # On equal starts this side goes first; the other side's interval then sees it as live
+            if b == len(other_order) or a < len(order) and starts[order[a]] <= other_starts[other_order[b]]:
+                i = order[a]
+                a += 1
+                start, end = starts[i], ends[i]
+                if end <= start:
+                    continue
+                while other_active and other_active[0][0] <= start:
+                    heapq.heappop(other_active)
+                for other_end, j in other_active:
+                    yield i, j, (end if end < other_end else other_end) - start
+                heapq.heappush(active, (end, i))
+            else:
+                j = other_order[b]
+                b += 1
+                start, end = other_starts[j], other_ends[j]
+                if end <= start:
+                    continue
+                while active and active[0][0] <= start:
+                    heapq.heappop(active)
+                for this_end, i in active:
+                    yield i, j, (end if end < this_end else this_end) - start
+                heapq.heappush(other_active, (end, j))
+
+
+def align_events(primary: Sequence[Dialog], secondary: Sequence[Dialog], min_overlap: int = 1) -> list[list[int]]:
+    """Match each secondary event to the primary event it overlaps most, by at least ``min_overlap`` ms.
+
+    Returns, for every primary event, the indices of its secondary events in start order.
+    """
+    index = IntervalIndex(primary)
+    starts = index.starts
+    best_overlap = [min_overlap - 1] * len(secondary)
+    best_primary = [-1] * len(secondary)
+    for i, j, overlap in index.join(IntervalIndex(secondary)):
+        best = best_overlap[j]
+        # Ties go to the earliest primary event, whatever order the join yields pairs in
+        if overlap > best or overlap == best and best_primary[j] >= 0 and (starts[i], i) < (
+                starts[best_primary[j]], best_primary[j]):
+            best_overlap[j] = overlap
+            best_primary[j] = i
+
+    matches: list[list[int]] = [[] for _ in primary]
+    for j, i in enumerate(best_primary):
+        if i >= 0:
+            matches[i].append(j)
+    for indices in matches:
+        if len(indices) > 1:
+            indices.sort(key=lambda j: (secondary[j].start, j))
+    return matches
+
+
+def _with_text(event: Dialog, text: str) -> Dialog:
+    # Cheaper than dataclasses.replace, which matters for tracks of 100k lines
+    return Dialog(event.start, event.end, text, event.style, event.name, event.pos, event.color)
+
+
+def align(primary: Subtitle, secondary: Subtitle, min_overlap: int = 1, keep_unmatched: bool = True,
+          separator: str = "\n") -> Subtitle:
+    """Merge ``secondary`` into ``primary`` as a second line of text, e.g. a translation under processed
+    Japanese lines. Secondary lines overlapping no primary line are kept as lines of their own unless
+    ``keep_unmatched`` is false. Neither input is modified.
+    """
+    matches = align_events(primary.events, secondary.events, min_overlap)
+
+    doc = Subtitle()
+    doc.res_x, doc.res_y = primary.res_x, primary.res_y
+    events = Events()
+    for event, indices in zip(primary.events, matches):
+        if indices:
+            lines = " ".join(secondary.events[j].text.replace("\n", " ") for j in indices)
+            event = _with_text(event, f"{event.text}{separator}{lines}")
+        events.append(event)
+
+    matched = sum(len(indices) for indices in matches)
+    if keep_unmatched and matched < len(secondary.events):
+        used = set(j for indices in matches for j in indices)
+        events.extend(_with_text(event, event.text) for j, event in enumerate(secondary.events) if j not in used)
+        events.sort(key=lambda event: event.start)
+    doc.events = events
+
+    logger.info(f"Aligned {matched} of {len(secondary.events)} secondary lines to {len(primary.events)} lines")
+    return doc
@@ -0,0 +1,162 @@
+import io
+import logging
+import os
+import tarfile
+import time
+import zipfile
+from collections.abc import Iterator
+from contextlib import suppress
+from pathlib import Path, PurePosixPath
+
+from .fileio import temporary_path
+
+__all__ = (
+    "ARCHIVE_SUFFIXES",
+    "is_archive",
+    "archive_stem",
+    "iter_archive_members",
+    "ArchiveWriter",
+)
+
+logger = logging.getLogger(__name__)
+
+TAR_MODES = {
+    ".tar": "",
+    ".tar.gz": "gz",
+    ".tgz": "gz",
+    ".tar.bz2": "bz2",
+    ".tbz2": "bz2",
+    ".tar.xz": "xz",
+    ".txz": "xz",
+}
+ARCHIVE_SUFFIXES = (".zip",) + tuple(TAR_MODES)
+
+
+def _archive_suffix(path: Path | str) -> str | None:
+    name = Path(path).name.lower()
+    # Longest suffix first so ".tar.gz" wins over a bare ".gz"
+    for suffix in sorted(ARCHIVE_SUFFIXES, key=len, reverse=True):
+        if name.endswith(suffix):
+            return suffix
+    return None
+
+
+def is_archive(path: Path | str) -> bool:
+    return _archive_suffix(path) is not None
+
+
+def archive_stem(path: Path | str) -> str:
+    """Archive file name without its (possibly compound) suffix, e.g. ``season1`` for ``season1.tar.gz``."""
+    path = Path(path)
+    suffix = _archive_suffix(path)
+    return path.name[:-len(suffix)] if suffix else path.stem
+
+
+def _safe_member_name(name: str) -> str | None:
+    parts = [part for part in PurePosixPath(name.replace("\\", "/")).parts if part not in ("", ".", "/")]
+    if not parts or ".." in parts:
+        return None
+    return "/".join(parts)
+
+
+def iter_archive_members(path: Path | str, suffixes: tuple[str, ...]) -> Iterator[tuple[str, bytes]]:
+    """Yield ``(member_name, content)`` for every regular member whose suffix is in ``suffixes``.
+
+    Tar archives are read as a stream, so compressed tarballs are decompressed only once.
+    """
+    path = Path(path)
+    suffix = _archive_suffix(path)
+    if suffix is None:
+        raise ValueError(f"Not an archive: {path}")
+
+    if suffix == ".zip":
+        with zipfile.ZipFile(path) as zf:
+            for info in zf.infolist():
+                name = _safe_member_name(info.filename)
+                if info.is_dir() or name is None or PurePosixPath(name).suffix not in suffixes:
+                    continue
+                yield name, zf.read(info)
+        return
+
+    with tarfile.open(path, f"r|{TAR_MODES[suffix] or '*'}") as tf:
+        for member in tf:
+            name = _safe_member_name(member.name)
+            if not member.isfile() or name is None or PurePosixPath(name).suffix not in suffixes:
+                continue
+            fileobj = tf.extractfile(member)
+            if fileobj is None:
+                logger.warning(f"Could not read archive member {member.name} in {path}")
+                continue
+            yield name, fileobj.read()
+
+
+class ArchiveWriter:
+    """Collects output files into a single zip or tar archive.
+
+    The archive is built under a temporary name and only appears at ``path`` once closed.
+    """
+
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+        suffix = _archive_suffix(self.path)
+        if suffix is None:
+            raise ValueError(f"Unsupported archive format: {self.path.name}")
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp_path = temporary_path(self.path)
+        self._names = set()
+        if suffix == ".zip":
+            self._zip = zipfile.ZipFile(self._tmp_path, "x", compression=zipfile.ZIP_DEFLATED)
+            self._tar = None
+        else:
+            self._zip = None
+            self._tar = tarfile.open(self._tmp_path, f"x:{TAR_MODES[suffix]}" if TAR_MODES[suffix] else "x")
+
+    def write(self, name: str, data: bytes) -> None:
+        if name in self._names:
+            logger.warning(f"Duplicate archive member {name} in {self.path}")
+        self._names.add(name)
+
+        if self._zip is not None:
+            self._zip.writestr(name, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self._tar.addfile(info, io.BytesIO(data))
+
+    def _close_file(self) -> None:
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+        if self._tar is not None:
+            self._tar.close()
+            self._tar = None
+
+    def close(self) -> None:
+        """Finish the archive and move it to ``path``."""
+        if self._tmp_path is None:
+            return
+        self._close_file()
+        os.replace(self._tmp_path, self.path)
+        self._tmp_path = None
+
+    def abort(self) -> None:
+        """Discard the partly written archive, leaving any previous file at ``path`` untouched."""
+        if self._tmp_path is None:
+            return
+        try:
+            self._close_file()
+        finally:
+            with suppress(FileNotFoundError):
+                os.unlink(self._tmp_path)
+            self._tmp_path = None
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
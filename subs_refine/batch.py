@@ -0,0 +1,434 @@
+import logging
+import multiprocessing
+import sys
+import time
+from collections import deque
+from collections.abc import Iterable, Iterator
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait as futures_wait
+from dataclasses import dataclass
+from multiprocessing.connection import wait
+from pathlib import Path
+
+from .compression import open_compressed, split_compression
+from .config import ProcessingConfig
+from .manifest import file_digest
+from .memory import MemoryUsage, track_phase, tracing
+from .processor import CompiledProcessor, Processor
+from .recurring import RecurringIndex
+from .sqlite_sink import EventRow, event_rows
+from .subtitle import Subtitle
+
+__all__ = (
+    "BatchRunner",
+    "CostModel",
+    "FileCost",
+    "FileResult",
+    "estimate_cost",
+    "process_file",
+)
+
+logger = logging.getLogger(__name__)
+
+# Rough ratio between the decompressed size of a subtitle file and the memory it occupies while being processed
+MEMORY_PER_INPUT_BYTE = 10
+
+BACKENDS = ("process", "thread")
+
+# Times smaller files may be dispatched ahead of one that does not fit in the memory budget before the
+# runner waits for enough memory to free up for it
+HEAD_SKIP_LIMIT = 8
+
+COUNT_CHUNK_SIZE = 1 << 20
+
+# Byte sequence occurring once per event, used to count events without parsing
+EVENT_MARKERS = {
+    ".ass": b"\nDialogue:",
+    ".srt": b"-->",
+    ".vtt": b"-->",
+}
+
+# Typical decompressed to compressed size ratio of subtitle text per codec, and typical bytes per event, so
+# that compressed files are estimated without decompressing every input before dispatch
+COMPRESSION_RATIOS = {
+    ".gz": 5,
+    ".bz2": 6,
+    ".xz": 6,
+}
+BYTES_PER_EVENT = {
+    ".ass": 110,
+    ".srt": 50,
+    ".vtt": 50,
+}
+
+
+@dataclass
+class CostModel:
+    """Linear estimate of the seconds needed to process a file."""
+    per_file: float = 2e-3
+    per_byte: float = 1e-7
+    per_event: float = 8e-5
+
+    def predict(self, size: int, events: int) -> float:
+        return self.per_file + self.per_byte * size + self.per_event * events
+
+    @classmethod
+    def fit(cls, samples: Iterable[tuple[int, int, float]]) -> "CostModel":
+        """Least-squares fit from ``(size, events, seconds)`` samples, e.g. a schedule report."""
+        rows = [(1.0, float(size), float(events), seconds) for size, events, seconds in samples]
+        # Normal equations (X^T X) b = X^T y, solved by Gaussian elimination with partial pivoting
+        matrix = [[sum(r[i] * r[j] for r in rows) for j in range(3)] + [sum(r[i] * r[3] for r in rows)]
+                  for i in range(3)]
+        for col in range(3):
+            pivot = max(range(col, 3), key=lambda r: abs(matrix[r][col]))
+            if abs(matrix[pivot][col]) < 1e-12:
+                raise ValueError("Not enough varied samples to fit a cost model")
+            matrix[col], matrix[pivot] = matrix[pivot], matrix[col]
+            for r in range(3):
+                if r != col:
+                    factor = matrix[r][col] / matrix[col][col]
+                    matrix[r] = [a - factor * b for a, b in zip(matrix[r], matrix[col])]
+        return cls(*(matrix[i][3] / matrix[i][i] for i in range(3)))
+
+
+@dataclass
+class FileCost:
+    size: int = 0
+    events: int = 0
+    predicted: float = 0.0  # Seconds
+    raw_size: int = 0  # Decompressed size, estimated from COMPRESSION_RATIOS for compressed files
+
+    @property
+    def memory(self) -> int:
+        return self.raw_size * MEMORY_PER_INPUT_BYTE
+
+
+def scan_events(path: Path) -> tuple[int, int]:
+    """Count the event markers of ``path`` chunk by chunk, decompressing on the fly.
+
+    Returns the number of events and the decompressed size. Uncompressed files of unknown types are
+    not read.
+    """
+    plain, compression = split_compression(path)
+    marker = EVENT_MARKERS.get(plain.suffix)
+    if marker is None and compression is None:
+        return 0, path.stat().st_size
+    count = size = 0
+    tail = b""  # End of the previous chunk, too short to hold a whole marker
+    with open(path, "rb") if compression is None else open_compressed(path, compression) as f:
+        while chunk := f.read(COUNT_CHUNK_SIZE):
+            size += len(chunk)
+            if marker is not None:
+                data = tail + chunk
+                count += data.count(marker)
+                tail = data[-(len(marker) - 1):]
+    return count, size
+
+
+def count_events(path: Path) -> int:
+    return scan_events(path)[0]
+
+
+def estimate_cost(path: Path, model: CostModel | None = None) -> FileCost:
+    """Estimate the cost of ``path``. Uncompressed files are scanned for event markers; compressed files
+    are not read, their decompressed size and events being extrapolated from the compressed size.
+    """
+    model = model or CostModel()
+    try:
+        size = path.stat().st_size
+        plain, compression = split_compression(path)
+        if compression is None:
+            events, raw_size = scan_events(path)
+        else:
+            raw_size = size * COMPRESSION_RATIOS[compression]
+            events = raw_size // BYTES_PER_EVENT[plain.suffix] if plain.suffix in BYTES_PER_EVENT else 0
+    except Exception as e:  # Corrupt compressed data, for instance; processing the file will report it
+        logger.debug(f"Cannot estimate the cost of {path}: {e}")
+        return FileCost()
+    return FileCost(size, events, model.predict(size, events), raw_size)
+
+
+@dataclass
+class FileResult:
+    path: Path
+    output: Path | None = None  # Written output file
+    name: str | None = None  # Output file name when the content is collected instead of written
+    content: bytes | None = None
+    sha256: str | None = None
+    error: str | None = None
+    input_bytes: int = 0
+    elapsed: float = 0.0
+    cost: FileCost | None = None  # Estimate made before dispatch
+    cache_hits: int = 0
+    cache_misses: int = 0
+    memory: MemoryUsage | None = None  # Per-phase peak allocations, when tracked
+    events: list[EventRow] | None = None  # Processed events, when collected for a database
+
+
+def process_file(processor: Processor, path: Path, collect: bool = False, digest: bool = False,
+                 track_memory: bool = False, events: bool = False) -> FileResult:
+    """Process one file, never raising.
+
+    With ``collect`` the output is returned instead of written; with ``digest`` the input's SHA-256 is
+    computed for the manifest; with ``track_memory`` peak allocations are recorded per phase; with
+    ``events`` the processed events are returned as rows for :class:`SQLiteSink`.
+    """
+    result = FileResult(path, memory=MemoryUsage() if track_memory else None)
+    memory = result.memory
+
+    def keep_events(doc: Subtitle) -> None:
+        result.events = event_rows(doc)
+
+    cache_before = processor.text_cache_info()
+    start = time.perf_counter()
+    # One trace across the phases, so each phase's peak includes what earlier phases left alive
+    with tracing() if memory is not None else nullcontext():
+        try:
+            result.input_bytes = path.stat().st_size
+            if collect:
+                with track_phase(memory, "parse"):
+                    doc = processor.load(path)
+                if memory is not None:
+                    memory.events_in = len(doc.events)
+                with track_phase(memory, "process"):
+                    processor.process_subtitle(doc)
+                if memory is not None:
+                    memory.events_out = len(doc.events)
+                doc = processor.attach_tracks(doc, path)
+                if events:
+                    keep_events(doc)
+                result.name = processor.output_filename(path)
+                with track_phase(memory, "save"):
+                    result.content = processor.serialize(doc)
+            else:
+                result.output = processor.process_and_save(path, memory, keep_events if events else None)
+            if digest:
+                result.sha256 = file_digest(path)
+        except Exception as e:
+            logger.error(f"Error processing file {path}: {e}")
+            result.error = f"Error processing file {path}: {e}"
+    result.elapsed = time.perf_counter() - start
+    if memory is not None and result.error is None:
+        # Measured here rather than estimated, to calibrate MEMORY_PER_INPUT_BYTE against actual sizes
+        compression = split_compression(path)[1]
+        memory.raw_bytes = scan_events(path)[1] if compression is not None else result.input_bytes
+    cache_after = processor.text_cache_info()
+    result.cache_hits = cache_after.hits - cache_before.hits
+    result.cache_misses = cache_after.misses - cache_before.misses
+    return result
+
+
+def _worker_main(conn, config: ProcessingConfig, recurring: RecurringIndex | None, collect: bool, digest: bool,
+                 track_memory: bool, events: bool, max_files: int, max_bytes: int) -> None:
+    processor = Processor(config)
+    processor.recurring = recurring
+    files_done = 0
+    bytes_done = 0
+    while True:
+        try:
+            path = conn.recv()
+        except EOFError:
+            break
+        if path is None:
+            break
+        result = process_file(processor, path, collect, digest, track_memory, events)
+        files_done += 1
+        bytes_done += result.input_bytes
+        # Retire voluntarily so a long run does not accumulate heap fragmentation in one process
+        retire = bool(max_files and files_done >= max_files or max_bytes and bytes_done >= max_bytes)
+        conn.send((result, retire))
+        if retire:
+            break
+    conn.close()
+
+
+class _Worker:
+    def __init__(self, context, config: ProcessingConfig, recurring: RecurringIndex | None, collect: bool,
+                 digest: bool, track_memory: bool, events: bool, max_files: int, max_bytes: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main,
+                                       args=(child_conn, config, recurring, collect, digest, track_memory, events,
+                                             max_files, max_bytes),
+                                       daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.conn.close()
+        self.process.join()
+
+
+class _Admission:
+    """Files waiting for dispatch, longest first, and the estimated memory of those in flight."""
+
+    def __init__(self, files: Iterable[tuple[Path, FileCost]], max_inflight_bytes: int):
+        self.pending = deque(sorted(files, key=lambda item: item[1].predicted, reverse=True))
+        self.max_inflight_bytes = max_inflight_bytes
+        self.inflight = 0
+        self.running = 0
+        self.skips = 0  # Files dispatched ahead of the current head
+
+    def __bool__(self) -> bool:
+        return bool(self.pending)
+
+    def _fits(self, cost: FileCost) -> bool:
+        # A file larger than the whole budget still runs, but alone
+        return not self.running or not self.max_inflight_bytes or \
+            self.inflight + cost.memory <= self.max_inflight_bytes
+
+    def take(self) -> tuple[Path, FileCost] | None:
+        """Next file to dispatch, or ``None`` to wait for a running file to finish."""
+        if not self.pending:
+            return None
+        if self._fits(self.pending[0][1]):
+            item = self.pending.popleft()
+            self.skips = 0
+        else:
+            if self.skips >= HEAD_SKIP_LIMIT:
+                return None
+            index = next((i for i, (_, cost) in enumerate(self.pending) if self._fits(cost)), None)
+            if index is None:
+                return None
+            item = self.pending[index]
+            del self.pending[index]
+            self.skips += 1
+        self.inflight += item[1].memory
+        self.running += 1
+        return item
+
+    def release(self, cost: FileCost) -> None:
+        self.inflight -= cost.memory
+        self.running -= 1
+
+
+class BatchRunner:
+    """Runs files through worker processes while keeping estimated memory use under a budget.
+
+    A file is only dispatched while the estimated memory of the files in flight stays within
+    ``max_inflight_bytes``; a single file larger than the budget still runs, but alone. When the next
+    file does not fit, smaller ones that do go ahead of it, up to ``HEAD_SKIP_LIMIT`` times before
+    waiting for memory to free up for it. Workers are
+    replaced after ``max_files_per_worker`` files or ``max_bytes_per_worker`` input bytes.
+    Files are dispatched longest-first according to ``cost_model`` so that a few huge files do not
+    end up running alone at the end of the batch.
+    With ``jobs <= 1`` files are processed in the calling process, in the given order, and costs are
+    only estimated when ``estimate_costs`` is set. ``track_memory`` records per-phase peak allocations
+    in each result; tracing slows processing down noticeably.
+
+    With the ``thread`` backend, ``jobs`` threads share one :class:`CompiledProcessor` instead, with the
+    same scheduling and memory budget; nothing is pickled, but only free-threaded CPython builds run
+    them on several cores. Peak memory per file is not meaningful in this mode, as tracing is global.
+    """
+
+    def __init__(self, config: ProcessingConfig, jobs: int = 1, max_inflight_bytes: int = 0,
+                 max_files_per_worker: int = 0, max_bytes_per_worker: int = 0, collect: bool = False,
+                 digest: bool = False, cost_model: CostModel | None = None, estimate_costs: bool = False,
+                 track_memory: bool = False, backend: str = "process"):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend: {backend}")
+        self.config = config
+        self.jobs = jobs
+        self.backend = backend
+        self.max_inflight_bytes = max_inflight_bytes
+        self.max_files_per_worker = max_files_per_worker
+        self.max_bytes_per_worker = max_bytes_per_worker
+        self.collect = collect
+        self.digest = digest
+        self.cost_model = cost_model or CostModel()
+        self.estimate_costs = estimate_costs
+        self.track_memory = track_memory
+        self.recurring: RecurringIndex | None = None  # Handed to the processors of worker processes
+        self.collect_events = False  # Return processed events in each result, e.g. for a database
+        self.workers_started = 0
+
+    def run(self, files: Iterable[Path], processor: Processor | None = None) -> Iterator[FileResult]:
+        """Yield a result per file in completion order. ``processor`` is used when running in-process."""
+        if self.jobs <= 1:
+            if processor is None:
+                processor = Processor(self.config)
+                processor.recurring = self.recurring
+            for path in files:
+                cost = estimate_cost(path, self.cost_model) if self.estimate_costs else None
+                result = process_file(processor, path, self.collect, self.digest, self.track_memory,
+                                      self.collect_events)
+                result.cost = cost
+                yield result
+            return
+        if self.backend == "thread":
+            yield from self._run_threaded(files)
+        else:
+            yield from self._run_parallel(files)
+
+    def _schedule(self, files: Iterable[Path]) -> _Admission:
+        return _Admission(((path, estimate_cost(path, self.cost_model)) for path in files), self.max_inflight_bytes)
+
+    def _run_threaded(self, files: Iterable[Path]) -> Iterator[FileResult]:
+        if getattr(sys, "_is_gil_enabled", lambda: True)():
+            logger.info("The GIL is enabled, threads will not process files in parallel")
+        processor = CompiledProcessor(self.config, self.recurring)
+        pending = self._schedule(files)
+        busy: dict = {}  # future -> estimated cost
+
+        with ThreadPoolExecutor(self.jobs, thread_name_prefix="subs_refine") as executor:
+            while pending or busy:
+                while len(busy) < self.jobs and (item := pending.take()) is not None:
+                    path, cost = item
+                    future = executor.submit(process_file, processor, path, self.collect, self.digest,
+                                             self.track_memory, self.collect_events)
+                    busy[future] = cost
+
+                done, _ = futures_wait(busy, return_when=FIRST_COMPLETED)
+                for future in done:
+                    cost = busy.pop(future)
+                    pending.release(cost)
+                    result = future.result()
+                    result.cost = cost
+                    yield result
+
+    def _spawn(self, context) -> _Worker:
+        self.workers_started += 1
+        return _Worker(context, self.config, self.recurring, self.collect, self.digest, self.track_memory,
+                       self.collect_events, self.max_files_per_worker, self.max_bytes_per_worker)
+
+    def _run_parallel(self, files: Iterable[Path]) -> Iterator[FileResult]:
+        context = multiprocessing.get_context()
+        pending = self._schedule(files)
+        idle: list[_Worker] = []
+        busy: dict = {}  # connection -> (worker, path, estimated cost)
+
+        try:
+            while pending or busy:
+                while len(busy) < self.jobs and (item := pending.take()) is not None:
+                    path, cost = item
+                    worker = idle.pop() if idle else self._spawn(context)
+                    worker.conn.send(path)
+                    busy[worker.conn] = (worker, path, cost)
+
+                for conn in wait(list(busy)):
+                    worker, path, cost = busy.pop(conn)
+                    pending.release(cost)
+                    try:
+                        result, retire = conn.recv()
+                    except EOFError:
+                        worker.process.join()
+                        logger.error(f"Worker exited with code {worker.process.exitcode} while processing {path}")
+                        yield FileResult(path, error=f"Worker exited unexpectedly "
+                                                     f"(exit code {worker.process.exitcode})", cost=cost)
+                        conn.close()
+                        continue
+                    if retire:
+                        worker.stop()
+                    else:
+                        idle.append(worker)
+                    result.cost = cost
+                    yield result
+        finally:
+            for worker in idle:
+                worker.stop()
+            for worker, _, _ in busy.values():
+                worker.process.terminate()
+                worker.conn.close()
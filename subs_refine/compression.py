@@ -0,0 +1,55 @@
+import bz2
+import gzip
+import lzma
+from pathlib import Path
+
+__all__ = (
+    "COMPRESSION_SUFFIXES",
+    "split_compression",
+    "sniff_compression",
+    "compress",
+    "decompress",
+    "open_compressed",
+)
+
+# Suffix -> stdlib module handling it; every module offers open(), compress() and decompress()
+COMPRESSION_SUFFIXES = {
+    ".gz": gzip,
+    ".bz2": bz2,
+    ".xz": lzma,
+}
+
+COMPRESSION_MAGIC = (
+    (b"\x1f\x8b", ".gz"),
+    (b"BZh", ".bz2"),
+    (b"\xfd7zXZ\x00", ".xz"),
+)
+
+
+def split_compression(path: Path | str) -> tuple[Path, str | None]:
+    """Split ``ep01.ass.gz`` into ``(ep01.ass, ".gz")``; paths without a compression suffix get ``None``."""
+    path = Path(path)
+    if path.suffix in COMPRESSION_SUFFIXES:
+        return path.with_suffix(""), path.suffix
+    return path, None
+
+
+def sniff_compression(data: bytes) -> str | None:
+    """Compression suffix matching the magic bytes at the start of ``data``, if any."""
+    for magic, suffix in COMPRESSION_MAGIC:
+        if data.startswith(magic):
+            return suffix
+    return None
+
+
+def compress(data: bytes, suffix: str) -> bytes:
+    return COMPRESSION_SUFFIXES[suffix].compress(data)
+
+
+def decompress(data: bytes, suffix: str) -> bytes:
+    return COMPRESSION_SUFFIXES[suffix].decompress(data)
+
+
+def open_compressed(file, suffix: str, mode: str = "rb"):
+    """Stream through the codec of ``suffix``. ``file`` may be a path or a binary file object."""
+    return COMPRESSION_SUFFIXES[suffix].open(file, mode)
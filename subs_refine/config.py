@@ -25,6 +25,52 @@ def dict_to_dataclass(cls, data: dict):
     return cls(**kwargs)
 
 
+class FrozenDict(dict):
+    """Read-only dict held by frozen configurations. Copies and pickles are frozen too."""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError(f"{type(self).__name__} is read-only")
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return type(self), (dict(self),)
+
+
+class Freezable:
+    """Base of the configuration dataclasses. :func:`freeze` makes an instance read-only."""
+    _frozen = False
+
+    def __setattr__(self, name, value):
+        if self._frozen:
+            raise AttributeError(f"{type(self).__name__} is frozen")
+        super().__setattr__(name, value)
+
+    def __delattr__(self, name):
+        if self._frozen:
+            raise AttributeError(f"{type(self).__name__} is frozen")
+        super().__delattr__(name)
+
+
+def freeze(config: Freezable) -> Freezable:
+    """Make ``config`` and everything in it read-only, in place: nested settings are frozen, dicts become
+    :class:`FrozenDict` and lists tuples. Returns ``config``."""
+    for f in fields(config):
+        object.__setattr__(config, f.name, _frozen_value(getattr(config, f.name)))
+    object.__setattr__(config, "_frozen", True)
+    return config
+
+
+def _frozen_value(value):
+    if isinstance(value, Freezable):
+        return freeze(value)
+    if isinstance(value, dict):
+        return FrozenDict((key, _frozen_value(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return tuple(_frozen_value(item) for item in value)
+    return value
+
+
 class MergeStrategy(StrEnum):
     """Options for handling duplicate lines merging"""
     NONE = "none"
@@ -45,20 +91,32 @@ class OutputFormat(StrEnum):
     TXT = "txt"
     SRT = "srt"
     ASS = "ass"
+    JSONL = "jsonl"  # One JSON object per event
+    BIN = "bin"  # Compact length-prefixed binary events
+
+
+class Compression(StrEnum):
+    """Compression of output files"""
+    NONE = "none"
+    GZIP = "gz"
+    BZ2 = "bz2"
+    XZ = "xz"
 
 
 @dataclass
-class OutputSettings:
+class OutputSettings(Freezable):
     """Configuration for output formatting"""
     dir: Path | None = None
     format: OutputFormat = OutputFormat.TXT
     ending: str = ""  # String appended to each sentence end
     show_speaker: bool = False
     show_pause_tip: int = 0
+    compression: Compression = Compression.NONE
+    align_with: str = ""  # Track merged as second lines; {dir} and {stem} refer to the input file
 
 
 @dataclass
-class FullHalfConversion:
+class FullHalfConversion(Freezable):
     """Full-width/Half-width character conversion settings"""
     numbers: ConversionStrategy = ConversionStrategy.HALF
     letters: ConversionStrategy = ConversionStrategy.HALF
@@ -66,34 +124,120 @@ class FullHalfConversion:
 
 
 @dataclass
-class CJKSpacing:
+class CJKSpacing(Freezable):
     """Spacing rules between CJK and Western characters"""
     enabled: bool = False
     space_char: str = "\u2006"
 
 
 @dataclass
-class RepetitionHandling:
+class RepetitionHandling(Freezable):
     """Settings for handling repeated syllables"""
     enabled: bool = True
     connector: str = "… "  # String to connect repeated syllables
 
 
 @dataclass
-class Mapping:
+class Deduplication(Freezable):
+    """Collapsing of lines repeated by rolling captions"""
+    enabled: bool = False
+    window: int = 3  # How many preceding lines a repeat is looked up in
+    tolerance: int = 500  # Maximum gap in milliseconds between a line and its repeat
+
+
+@dataclass
+class Retiming(Freezable):
+    """Automatic retiming against a reference track"""
+    reference: str = ""  # Reference track; {dir} and {stem} refer to the input file
+    drift: bool = False  # Also correct a linear drift
+    resolution: int = 10  # Milliseconds per sample of the activity signals
+    max_offset: int = 60000  # Largest offset searched, in milliseconds
+
+
+class RecurringAction(StrEnum):
+    """What to do with line sequences recurring across the files of a batch"""
+    KEEP = "keep"
+    DROP = "drop"
+    TAG = "tag"  # Style "Recurring": comments in ASS output, the style field in jsonl and bin
+
+
+# Output formats that carry the style of a line, and so the tag of recurring lines
+TAGGED_FORMATS = (OutputFormat.ASS, OutputFormat.JSONL, OutputFormat.BIN)
+
+
+@dataclass
+class RecurringBlocks(Freezable):
+    """Detection of blocks such as opening/ending lyrics that repeat in every episode"""
+    action: RecurringAction = RecurringAction.KEEP
+    min_lines: int = 4  # Consecutive lines a recurring block must share
+    min_files: int = 3  # Files of the batch a block must occur in
+
+
+@dataclass
+class TimeRange(Freezable):
+    """Part of each input to process, in milliseconds; lines shown partly inside it are kept"""
+    start: int | None = None
+    end: int | None = None
+
+
+class RegexBudgetAction(StrEnum):
+    """What to do with a regex mapping that exceeds its time budget"""
+    DISABLE = "disable"
+    FLAG = "flag"  # Only report it
+
+
+@dataclass
+class Mapping(Freezable):
     text: dict[str, str] = field(default_factory=dict)
     regex: dict[str, str] = field(default_factory=dict)
+    regex_time_budget: float = 0  # Milliseconds per line and rule; 0 disables
+    regex_budget_action: RegexBudgetAction = RegexBudgetAction.DISABLE
+    reject_unsafe_regex: bool = True  # False only warns about patterns prone to catastrophic backtracking
+
+    def __post_init__(self):
+        from .regex_rules import check_regex
+
+        for pattern in self.regex:
+            risk = check_regex(pattern)
+            if risk and self.reject_unsafe_regex:
+                raise ValueError(f"Unsafe regex mapping {pattern!r}: {risk}")
+
+
+# Stages run after the type-specific cleanup, see subs_refine.stages
+DEFAULT_STAGES = ("spaces", "interjections", "cjk_spacing", "repeated_syllables", "text_mapping", "regex_mapping",
+                  "western_text", "deduplication")
+
+# Type-specific passes per detected subtitle type, see subs_refine.processor
+DEFAULT_TYPE_STAGES = {
+    "tv_ass": ("rubi", "full_half_tv_ass", "tv_markers", "speakers", "tv_ass_cleanup", "merge_by_time"),
+    "tv_srt": ("full_half", "tv_srt_split"),
+    "web": ("full_half", "web_split", "web_duplicates"),
+}
 
 
 @dataclass
-class ProcessingConfig:
+class ProcessingConfig(Freezable):
     merge_strategy: MergeStrategy = MergeStrategy.AUTO
     filter_interjections: bool = True
     output: OutputSettings = field(default_factory=OutputSettings)
     full_half_conversion: FullHalfConversion = field(default_factory=FullHalfConversion)
     cjk_spacing: CJKSpacing = field(default_factory=CJKSpacing)
     repetition_adjustment: RepetitionHandling = field(default_factory=RepetitionHandling)
+    deduplication: Deduplication = field(default_factory=Deduplication)
+    retiming: Retiming = field(default_factory=Retiming)
+    recurring: RecurringBlocks = field(default_factory=RecurringBlocks)
     mapping: Mapping = field(default_factory=Mapping)
+    stages: list[str] = field(default_factory=lambda: list(DEFAULT_STAGES))
+    type_stages: dict[str, list[str]] = field(
+        default_factory=lambda: {type_: list(names) for type_, names in DEFAULT_TYPE_STAGES.items()})
+    time_range: TimeRange = field(default_factory=TimeRange)
+    text_cache_size: int = 65536  # Processed lines memoized across files; 0 disables
+    incremental: bool = False  # Reuse unchanged parts of the previous output via a sidecar file
+
+    def __post_init__(self):
+        if self.recurring.action == RecurringAction.TAG and self.output.format not in TAGGED_FORMATS:
+            raise ValueError(f"recurring.action {RecurringAction.TAG} has no effect in {self.output.format} "
+                             f"output, use one of {', '.join(TAGGED_FORMATS)} or drop the lines instead")
 
     @classmethod
     def from_yaml(cls, path: Path | str, encoding: str = "utf-8") -> "ProcessingConfig":
@@ -1,6 +1,9 @@
 SCRIPT_VERSION = "v1.0.1"
 GITHUB_LINK = "https://github.com/MingYSub/SubRefine"
 
+# Texts of lines that are dropped as empty
+EMPTY_TEXTS = ("", "～")
+
 ASS_HEADER = (
     "[Script Info]\n"
     f"; Generated by SubsRefine {SCRIPT_VERSION}\n"
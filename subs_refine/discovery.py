@@ -0,0 +1,68 @@
+import logging
+import os
+from collections.abc import Sequence
+from fnmatch import fnmatch
+from pathlib import Path
+
+from .compression import COMPRESSION_SUFFIXES
+
+__all__ = (
+    "DEFAULT_INCLUDE",
+    "DEFAULT_EXCLUDE",
+    "discover_files",
+    "is_up_to_date",
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INCLUDE = tuple(f"*{suffix}{compression}" for suffix in (".ass", ".srt", ".vtt")
+                        for compression in ("", *COMPRESSION_SUFFIXES))
+DEFAULT_EXCLUDE = ("*_processed.*",)
+
+
+def _matches(name: str, relative: str, patterns: Sequence[str]) -> bool:
+    return any(fnmatch(name, pattern) or fnmatch(relative, pattern) for pattern in patterns)
+
+
+def discover_files(root: Path | str, recursive: bool = False, include: Sequence[str] = DEFAULT_INCLUDE,
+                   exclude: Sequence[str] = DEFAULT_EXCLUDE) -> list[Path]:
+    """List files under ``root`` matching ``include`` and none of ``exclude``.
+
+    Patterns are matched against both the file name and the path relative to ``root`` (with ``/``
+    separators); ``exclude`` also prunes directories when recursing. Uses ``os.scandir`` so file
+    types come from the directory listing instead of a stat per entry.
+    """
+    root = Path(root)
+    found = []
+    stack = [(root, "")]
+    while stack:
+        directory, prefix = stack.pop()
+        try:
+            entries = os.scandir(directory)
+        except OSError as e:
+            logger.warning(f"Cannot read directory {directory}: {e}")
+            continue
+        with entries:
+            for entry in entries:
+                relative = prefix + entry.name
+                if _matches(entry.name, relative, exclude):
+                    continue
+                if entry.is_dir():
+                    if recursive:
+                        stack.append((Path(entry.path), relative + "/"))
+                elif entry.is_file() and _matches(entry.name, relative, include):
+                    found.append(Path(entry.path))
+    return found
+
+
+def is_up_to_date(path: Path | str, output_path: Path | str, newer_than: float = 0.0) -> bool:
+    """Make-style check: ``output_path`` exists, is not older than ``path`` nor ``newer_than``
+    (e.g. the configuration file's mtime), and is not empty unless the input is."""
+    try:
+        source = os.stat(path)
+        target = os.stat(output_path)
+    except OSError:
+        return False
+    if target.st_size == 0 and source.st_size > 0:
+        return False
+    return target.st_mtime >= source.st_mtime and target.st_mtime >= newer_than
@@ -0,0 +1,40 @@
+import os
+import uuid
+from collections.abc import Iterator
+from contextlib import contextmanager, suppress
+from pathlib import Path
+
+__all__ = (
+    "atomic_open",
+    "atomic_write_bytes",
+    "temporary_path",
+)
+
+
+def temporary_path(path: Path | str) -> Path:
+    """Unique hidden sibling of ``path`` to write into before renaming."""
+    path = Path(path)
+    return path.with_name(f".{path.name}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp")
+
+
+@contextmanager
+def atomic_open(path: Path | str, mode: str = "w", encoding: str | None = None) -> Iterator:
+    """Open a temporary file that replaces ``path`` only after it has been written completely.
+
+    Readers see either the old file or the new one, never a truncated one.
+    """
+    path = Path(path)
+    tmp = temporary_path(path)
+    try:
+        with open(tmp, mode.replace("w", "x"), encoding=encoding) as f:
+            yield f
+        os.replace(tmp, path)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.unlink(tmp)
+        raise
+
+
+def atomic_write_bytes(path: Path | str, data: bytes) -> None:
+    with atomic_open(path, "wb") as f:
+        f.write(data)
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import logging
+import re
+from dataclasses import asdict
+from pathlib import Path
+
+from .config import ProcessingConfig
+from .fileio import atomic_open
+from .processor import Processor, SubtitleType, split_blocks
+from .subtitle import Subtitle, Events, Dialog
+
+__all__ = (
+    "process_incrementally",
+    "sidecar_path",
+)
+
+logger = logging.getLogger(__name__)
+
+SIDECAR_VERSION = 1
+UNKNOWN_NAME_PATTERN = re.compile(r"Unknown\d+")
+
+
+def sidecar_path(output_path: Path | str) -> Path:
+    output_path = Path(output_path)
+    return output_path.with_name(f"{output_path.name}.incremental.json")
+
+
+def config_fingerprint(config: ProcessingConfig) -> str:
+    data = asdict(config)
+    # Settings that do not change processed events
+    for key in ("output", "text_cache_size", "incremental"):
+        data.pop(key, None)
+    return hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _canonicalize_names(events: Events) -> dict[str, str]:
+    """Renumber ``UnknownN`` speakers from 1 within a block.
+
+    Speaker assignment numbers unknown speakers across the whole document, so an edit near the start
+    would otherwise change every later block. Returns the mapping back to the original names.
+    """
+    canonical = {}
+    for event in events:
+        if UNKNOWN_NAME_PATTERN.fullmatch(event.name):
+            event.name = canonical.setdefault(event.name, f"Unknown{len(canonical) + 1}")
+    return {local: original for original, local in canonical.items()}
+
+
+def _block_key(type_: SubtitleType, events: Events) -> str:
+    payload = json.dumps([type_.value, [event.to_dict() for event in events]], ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _load_sidecar(path: Path, fingerprint: str) -> dict[str, list[dict]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable incremental sidecar {path}: {e}")
+        return {}
+
+    if not isinstance(data, dict) or not isinstance(data.get("blocks", {}), dict):
+        logger.warning(f"Ignoring malformed incremental sidecar {path}")
+        return {}
+    if data.get("version") != SIDECAR_VERSION or data.get("fingerprint") != fingerprint:
+        logger.info(f"Configuration changed since {path} was written, processing from scratch")
+        return {}
+    return data.get("blocks", {})
+
+
+def _save_sidecar(path: Path, fingerprint: str, blocks: dict[str, list[dict]]) -> None:
+    with atomic_open(path, "w", encoding="utf-8") as f:
+        json.dump({"version": SIDECAR_VERSION, "fingerprint": fingerprint, "blocks": blocks}, f, ensure_ascii=False)
+
+
+def process_incrementally(processor: Processor, doc: Subtitle, sidecar: Path | str,
+                          type_: SubtitleType | str | None = None) -> None:
+    """Process ``doc`` like :meth:`Processor.process_subtitle`, reusing blocks recorded in ``sidecar``.
+
+    The whole-document passes (speaker assignment) always run. The prepared events are then cut by
+    :func:`split_blocks`, and only blocks whose prepared events differ from the previous run go through
+    the remaining passes. :meth:`Processor.finalize` runs again on the spliced result. The sidecar is
+    rewritten with the blocks of this run.
+    """
+    sidecar = Path(sidecar)
+    fingerprint = config_fingerprint(processor.config)
+    previous = _load_sidecar(sidecar, fingerprint)
+
+    type_ = processor.detect_type(doc, type_)
+    recurring = processor.recurring_ranges(doc)
+    processor.prepare(doc, type_)
+
+    blocks = {}
+    events = Events()
+    ranges = split_blocks(doc.events, type_)
+    reused = 0
+    for block in ranges:
+        part = Subtitle()
+        part.res_x, part.res_y = doc.res_x, doc.res_y
+        part.events = Events(doc.events[block.start:block.stop])
+        restore = _canonicalize_names(part.events)
+
+        key = _block_key(type_, part.events)
+        if key in previous:
+            output = previous[key]
+            reused += 1
+        else:
+            processor.finish(part, type_)
+            output = [event.to_dict() for event in part.events]
+        blocks[key] = output
+
+        for data in output:
+            event = Dialog.from_dict(data)
+            event.name = "/".join(restore.get(name, name) for name in event.name.split("/"))
+            events.append(event)
+
+    doc.events = events
+    processor.finalize(doc, recurring)
+    _save_sidecar(sidecar, fingerprint, blocks)
+    logger.info(f"Reused {reused} of {len(ranges)} blocks from {sidecar}")
@@ -0,0 +1,239 @@
+import logging
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass
+from pathlib import Path
+
+from .batch import process_file
+from .config import ProcessingConfig
+from .processor import Processor
+
+__all__ = (
+    "Job",
+    "JobQueue",
+    "run_worker",
+    "run_workers",
+)
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS jobs ("
+    "id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE, state TEXT NOT NULL DEFAULT 'pending', "
+    "attempts INTEGER NOT NULL DEFAULT 0, owner TEXT, lease_expires REAL, output TEXT, error TEXT, "
+    "updated_at REAL)",
+    "CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, lease_expires)",
+)
+
+
+@dataclass
+class Job:
+    id: int
+    path: Path
+    attempts: int
+    owner: str
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobQueue:
+    """Work queue in a SQLite database on storage shared by all hosts.
+
+    A worker claims a job for ``lease_seconds`` and has to renew the lease while it works on it; a job
+    whose lease runs out, e.g. because its host died, is handed to the next worker. A job is retried
+    until it has been attempted ``max_attempts`` times and is then marked failed. Leases compare wall
+    clock times, so the hosts' clocks must be synchronized.
+
+    The database uses a rollback journal rather than WAL, which does not work over network file
+    systems, and claims take the write lock up front (``BEGIN IMMEDIATE``) so that two workers never
+    claim the same job.
+    """
+
+    def __init__(self, path: Path | str, lease_seconds: float = 300, max_attempts: int = 3,
+                 timeout: float = 60):
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        # The heartbeat thread shares the connection
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode = DELETE")
+            for statement in SCHEMA:
+                self._conn.execute(statement)
+
+    def _write(self, statement: str, parameters: tuple = ()) -> int:
+        with self._lock:
+            return self._conn.execute(statement, parameters).rowcount
+
+    def enqueue(self, paths: Iterable[Path | str], retry_failed: bool = False) -> int:
+        """Add jobs for ``paths``, skipping those already queued. Returns the number of new jobs.
+
+        With ``retry_failed``, jobs that ran out of attempts are queued again.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                before = self._conn.total_changes
+                self._conn.executemany("INSERT OR IGNORE INTO jobs (path, updated_at) VALUES (?, ?)",
+                                       ((str(Path(path).resolve()), now) for path in paths))
+                added = self._conn.total_changes - before
+                if retry_failed:
+                    self._conn.execute("UPDATE jobs SET state = ?, attempts = 0, error = NULL, updated_at = ? "
+                                       "WHERE state = ?", (PENDING, now, FAILED))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return added
+
+    def claim(self, owner: str) -> Job | None:
+        """Lease the next pending job, or a running one whose lease has expired, to ``owner``."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Jobs abandoned by a crashed worker on their last attempt are not retried again
+                self._conn.execute("UPDATE jobs SET state = ?, error = 'Lease expired', updated_at = ? "
+                                   "WHERE state = ? AND lease_expires < ? AND attempts >= ?",
+                                   (FAILED, now, RUNNING, now, self.max_attempts))
+                row = self._conn.execute("SELECT id, path, attempts FROM jobs WHERE state = ? "
+                                         "OR state = ? AND lease_expires < ? ORDER BY attempts, id LIMIT 1",
+                                         (PENDING, RUNNING, now)).fetchone()
+                if row is not None:
+                    self._conn.execute("UPDATE jobs SET state = ?, owner = ?, lease_expires = ?, "
+                                       "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                                       (RUNNING, owner, now + self.lease_seconds, now, row[0]))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return Job(row[0], Path(row[1]), row[2] + 1, owner)
+
+    def heartbeat(self, job: Job) -> bool:
+        """Extend the lease of ``job``. Returns False if another worker has taken it over."""
+        return self._write("UPDATE jobs SET lease_expires = ? WHERE id = ? AND owner = ? AND state = ?",
+                           (time.time() + self.lease_seconds, job.id, job.owner, RUNNING)) == 1
+
+    def complete(self, job: Job, output: Path | str | None = None) -> None:
+        self._write("UPDATE jobs SET state = ?, output = ?, error = NULL, lease_expires = NULL, updated_at = ? "
+                    "WHERE id = ? AND owner = ?",
+                    (DONE, str(output) if output is not None else None, time.time(), job.id, job.owner))
+
+    def fail(self, job: Job, error: str) -> None:
+        """Record a failed attempt; the job is retried unless it has used up its attempts."""
+        state = FAILED if job.attempts >= self.max_attempts else PENDING
+        self._write("UPDATE jobs SET state = ?, error = ?, lease_expires = NULL, updated_at = ? "
+                    "WHERE id = ? AND owner = ?", (state, error, time.time(), job.id, job.owner))
+
+    def counts(self) -> dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return {state: 0 for state in (PENDING, RUNNING, DONE, FAILED)} | dict(rows)
+
+    def failures(self) -> list[tuple[str, str]]:
+        with self._lock:
+            return self._conn.execute("SELECT path, error FROM jobs WHERE state = ? ORDER BY id",
+                                      (FAILED,)).fetchall()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> "JobQueue":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+class _Heartbeat(threading.Thread):
+    def __init__(self, queue: JobQueue, job: Job):
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.job = job
+        self.stopped = threading.Event()
+        self.lost = False
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.queue.lease_seconds / 3):
+            try:
+                if not self.queue.heartbeat(self.job):
+                    self.lost = True
+                    return
+            except sqlite3.Error as e:
+                logger.warning(f"Heartbeat for {self.job.path} failed: {e}")
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.join()
+
+
+def run_worker(queue: JobQueue, processor: Processor, owner: str | None = None, poll_interval: float = 5.0) -> int:
+    """Process jobs until none are pending or running. Returns the number of jobs this worker finished.
+
+    While other workers still hold leases, this one keeps polling, since their jobs may come back.
+    """
+    owner = owner or default_worker_id()
+    finished = 0
+    while True:
+        job = queue.claim(owner)
+        if job is None:
+            if queue.counts()[RUNNING] == 0:
+                return finished
+            time.sleep(poll_interval)
+            continue
+
+        heartbeat = _Heartbeat(queue, job)
+        heartbeat.start()
+        try:
+            result = process_file(processor, job.path)
+        finally:
+            heartbeat.stop()
+        if heartbeat.lost:
+            logger.warning(f"[{owner}] Lost the lease on {job.path.name} (attempt {job.attempts}), "
+                           f"leaving it to the new owner")
+        elif result.error is not None:
+            queue.fail(job, result.error)
+            logger.info(f"[{owner}] Failed: {job.path.name} (attempt {job.attempts})")
+        else:
+            queue.complete(job, result.output)
+            finished += 1
+            logger.info(f"[{owner}] Done: {job.path.name} (attempt {job.attempts})")
+
+
+def _worker_main(queue_path: Path, config: ProcessingConfig, lease_seconds: float, max_attempts: int,
+                 poll_interval: float) -> None:
+    with JobQueue(queue_path, lease_seconds, max_attempts) as queue:
+        run_worker(queue, Processor(config), poll_interval=poll_interval)
+
+
+def run_workers(queue_path: Path | str, config: ProcessingConfig, jobs: int = 1, lease_seconds: float = 300,
+                max_attempts: int = 3, poll_interval: float = 5.0) -> None:
+    """Run ``jobs`` worker processes on this host until the queue is drained."""
+    args = (Path(queue_path), config, lease_seconds, max_attempts, poll_interval)
+    if jobs <= 1:
+        _worker_main(*args)
+        return
+    context = multiprocessing.get_context()
+    processes = [context.Process(target=_worker_main, args=args) for _ in range(jobs)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from contextlib import suppress
+from dataclasses import dataclass, asdict
+from pathlib import Path
+
+__all__ = (
+    "Manifest",
+    "ManifestEntry",
+    "file_digest",
+)
+
+logger = logging.getLogger(__name__)
+
+
+def fsync_path(path: Path | str) -> None:
+    """Flush a file or directory to disk. Platforms that cannot open directories skip them."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except (IsADirectoryError, PermissionError):
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def file_digest(path: Path | str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+@dataclass
+class ManifestEntry:
+    input: str
+    size: int
+    mtime_ns: int
+    sha256: str
+    output: str | None = None
+
+
+class Manifest:
+    """Append-only journal of completed inputs, one JSON object per line.
+
+    Entries are flushed as they are recorded but only fsynced every ``sync_every`` entries or
+    ``sync_interval`` seconds, together with the outputs they point at, so a crash loses at most the
+    last batch, which is then reprocessed.
+    A truncated last line from an interrupted write is ignored when loading.
+    """
+
+    def __init__(self, path: Path | str, sync_every: int = 100, sync_interval: float = 5.0):
+        self.path = Path(path)
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.entries: dict[str, ManifestEntry] = {}
+        self._load()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._unsynced = 0
+        self._unsynced_outputs: set[Path] = set()
+        self._last_sync = time.monotonic()
+        # A new manifest's directory entry must reach the disk too
+        self._sync_dir = True
+
+    @staticmethod
+    def _key(path: Path | str) -> str:
+        return str(Path(path).resolve())
+
+    def _load(self) -> None:
+        try:
+            f = open(self.path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return
+        with f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    entry = ManifestEntry(**json.loads(line))
+                except (ValueError, TypeError):
+                    logger.warning(f"Skipping malformed manifest line {line_number} in {self.path}")
+                    continue
+                self.entries[entry.input] = entry
+
+    def is_complete(self, path: Path | str) -> bool:
+        """Whether ``path`` was processed before and has not changed since."""
+        entry = self.entries.get(self._key(path))
+        if entry is None:
+            return False
+        if entry.output is not None and not Path(entry.output).exists():
+            return False
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        if stat.st_size != entry.size:
+            return False
+        # Same size but touched: fall back to comparing content
+        return stat.st_mtime_ns == entry.mtime_ns or file_digest(path) == entry.sha256
+
+    def record(self, path: Path | str, output: Path | str | None = None, sha256: str | None = None) -> None:
+        stat = os.stat(path)
+        entry = ManifestEntry(
+            input=self._key(path),
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            sha256=sha256 or file_digest(path),
+            output=str(output) if output is not None else None,
+        )
+        self.entries[entry.input] = entry
+        if output is not None:
+            self._unsynced_outputs.add(Path(output))
+        self._file.write(json.dumps(asdict(entry), ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every or time.monotonic() - self._last_sync >= self.sync_interval:
+            self.sync()
+
+    def sync(self) -> None:
+        if not self._unsynced:
+            return
+        # Make the outputs durable before the entries pointing at them; outputs are renamed into
+        # place, so their directories are synced as well
+        for output in self._unsynced_outputs:
+            with suppress(FileNotFoundError):
+                fsync_path(output)
+        for directory in {output.parent for output in self._unsynced_outputs}:
+            fsync_path(directory)
+        os.fsync(self._file.fileno())
+        if self._sync_dir:
+            fsync_path(self.path.parent)
+            self._sync_dir = False
+        self._unsynced_outputs.clear()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self.sync()
+        self._file.close()
+
+    def __enter__(self) -> "Manifest":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
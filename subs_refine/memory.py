@@ -0,0 +1,82 @@
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+
+__all__ = (
+    "MemoryUsage",
+    "track_phase",
+    "tracing",
+)
+
+PHASES = ("parse", "process", "save")
+
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_started_tracing = False
+
+
+@contextmanager
+def tracing():
+    """Trace allocations inside the block. Nested and concurrent blocks share one trace, which is stopped
+    when the last of them exits unless tracing was already on before the first.
+    """
+    global _tracing_users, _started_tracing
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracing = True
+        _tracing_users += 1
+    try:
+        yield
+    finally:
+        with _tracing_lock:
+            _tracing_users -= 1
+            if _tracing_users == 0 and _started_tracing:
+                tracemalloc.stop()
+                _started_tracing = False
+
+
+@dataclass
+class MemoryUsage:
+    """Peak Python allocations while handling one file, measured with :mod:`tracemalloc`.
+
+    Peaks are in bytes and relative to what was allocated when the file was started, so they include
+    everything still alive from earlier phases (e.g. the parsed document during ``process``), as long as
+    the phases run inside one :func:`tracing` block.
+    """
+    parse: int = 0
+    process: int = 0
+    save: int = 0
+    events_in: int = 0
+    events_out: int = 0
+    raw_bytes: int = 0  # Decompressed input size
+    _baseline: int | None = field(default=None, repr=False)
+
+    @property
+    def peak(self) -> int:
+        return max(self.parse, self.process, self.save)
+
+    @property
+    def bytes_per_event(self) -> float:
+        return self.peak / self.events_in if self.events_in else 0.0
+
+    @contextmanager
+    def phase(self, name: str):
+        if name not in PHASES:
+            raise ValueError(f"Unknown phase: {name}")
+        with tracing():
+            current, _ = tracemalloc.get_traced_memory()
+            if self._baseline is None:
+                self._baseline = current
+            tracemalloc.reset_peak()
+            try:
+                yield
+            finally:
+                _, peak = tracemalloc.get_traced_memory()
+                setattr(self, name, max(peak - self._baseline, 0))
+
+
+def track_phase(usage: MemoryUsage | None, name: str):
+    """``usage.phase(name)``, or a no-op when memory is not being tracked."""
+    return usage.phase(name) if usage is not None else nullcontext()
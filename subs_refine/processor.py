@@ -1,16 +1,28 @@
+import copy
 import logging
-from collections import defaultdict
+import threading
+import unicodedata
+from collections import Counter, defaultdict
 from enum import StrEnum
+from functools import lru_cache
 from itertools import chain
 from pathlib import Path
-from typing import overload, Sequence
-
-from .config import ProcessingConfig, MergeStrategy, FullHalfConversion
+from typing import overload, Callable, Sequence
+
+from .compression import compress, split_compression
+from .config import (ProcessingConfig, MergeStrategy, FullHalfConversion, OutputSettings, RecurringAction,
+                     Compression, Mapping, freeze)
+from .constants import EMPTY_TEXTS
+from .memory import MemoryUsage, track_phase
+from .recurring import RecurringIndex, mark_recurring
+from .regex_rules import StaticRegexRules
+from .stages import Stage, compile_passes, compile_stages, register_stage
 from .subtitle import Subtitle, Events, Dialog
 from .subtitle.types import Color, Position
 from .text_processing import *
 
 __all__ = (
+    "CompiledProcessor",
     "Processor",
     "SubtitleType",
 )
@@ -18,6 +30,7 @@ __all__ = (
 logger = logging.getLogger(__name__)
 
 WHITE = Color(255, 255, 255)
+WHITESPACE_PATTERN = re.compile(r"\s+")
 
 AUDIO_MARKERS = ("♪♪", "♪", "♬", "⚟", "⚞", "📱", "☎", "📞", "🔊", "📢", "📺", "🎤"
                  "💻", "모", "🎧", "📼", "🖭", "・", "〓", "⎚", "＝", "", "≫", ">>")
@@ -29,6 +42,20 @@ TV_EXCLUSIVE_MARKERS = ("♪♪", "⚟", "⚞", "📱", "☎", "📞", "🔊", "
                         "⎚", "＝", "≫", ">>", "｟", "（（", "→", "➡", "➨", "⤵️", "➥", "・～", "・(", "・（", "｡", "[外:")
 TV_SPLIT_PATTERN = re.compile(f"\u3000(?=[(（{''.join(chain(AUDIO_MARKERS, PARENTHESIS_START_MARKERS))}])"
                               f"|(?<=[{''.join(PARENTHESIS_END_MARKERS)}])\u3000")
+CONTINUOUS_LINE_PATTERN = re.compile("|".join(map(re.escape, CONTINUOUS_LINE_MARKERS)))
+
+# Compiled once rather than looked up in the re module's cache for every event
+GAIJI_PATTERN = re.compile(r"\[外：[0-9A-Z]{32}]")
+SPEAKER_PATTERN = re.compile(r"（(.*?)）")
+EXCLAMATION_SPACING_PATTERN = re.compile(r"(?<=[？！])(?![\u3000？！」』]|$)")
+TV_SRT_PARENTHESES_PATTERN = re.compile(r"\(.*?\)|（.*?）")
+WEB_TAG_PATTERN = re.compile(r"<.*?>|{.*?}")
+WEB_SPLIT_PATTERN = re.compile("\u3000(?=[-（])")
+WEB_PARENTHESES_PATTERN = re.compile(r"\(.*?\)")
+# Both alternatives are anchored at the start, so one pass equals applying them one after the other
+WEB_LINE_ANNOTATION_PATTERN = re.compile(r"^〔.*?〕$|^(?:- ?)?（.*?）")
+WEB_PREFIXES = ("〈", "・～", "♪～", "♪")
+WEB_SUFFIXES = ("〉", "～・", "～♪", "♪", "⸺")
 
 
 class SubtitleType(StrEnum):
@@ -53,7 +80,7 @@ def remove_line_markers(text: str) -> str:
 
 def guess_same_speaker(event1, event2, x_spacing=60, y_spacing=60) -> bool:
     return (event1.start == event2.start and event1.end == event2.end
-            and event1.color == event1.color
+            and event1.color == event2.color
             and event1.pos.y and event2.pos.y
             and (event1.pos.y == event2.pos.y
                  or abs(event1.pos.x - event2.pos.x) <= x_spacing
@@ -62,8 +89,50 @@ def guess_same_speaker(event1, event2, x_spacing=60, y_spacing=60) -> bool:
             )
 
 
+def _speaker_groups(events: Sequence[Dialog], x_spacing: int = 60, y_spacing: int = 60) -> list[int]:
+    """Group the events that :func:`guess_same_speaker` would pair, over whole cues rather than neighbours.
+
+    Events are bucketed by timing and color, and the positions in a bucket are indexed in a grid of
+    ``x_spacing`` × ``y_spacing`` cells, so each event is only compared with the events in the cells
+    around it. Pairs are joined with union-find; returns the index of a representative for each event.
+    """
+    parent = list(range(len(events)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i: int, j: int) -> None:
+        i, j = find(i), find(j)
+        if i != j:
+            parent[max(i, j)] = min(i, j)
+
+    grids = defaultdict(lambda: defaultdict(list))
+    rows = {}
+    for index, event in enumerate(events):
+        if event.pos is None or not event.pos.y:
+            continue
+        cue = (event.start, event.end, event.color)
+        # Lines on the same row belong together however far apart they are
+        row = rows.setdefault((cue, event.pos.y), index)
+        if row != index:
+            union(row, index)
+        grid = grids[cue]
+        cell_x, cell_y = event.pos.x // max(x_spacing, 1), event.pos.y // max(y_spacing, 1)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for other in grid.get((cell_x + dx, cell_y + dy), ()):
+                    if guess_same_speaker(event, events[other], x_spacing, y_spacing):
+                        union(other, index)
+        grid[(cell_x, cell_y)].append(index)
+
+    return [find(index) for index in range(len(events))]
+
+
 def filter_empty_lines(doc: Subtitle) -> None:
-    doc.events = Events(event for event in doc.events if event.text not in ("", "～"))
+    doc.events = Events(event for event in doc.events if event.text not in EMPTY_TEXTS)
 
 
 def full_half_conversion(doc: Subtitle, conversion: FullHalfConversion, raw: str = "", converted: str = ""):
@@ -77,222 +146,439 @@ def full_half_conversion(doc: Subtitle, conversion: FullHalfConversion, raw: str
             event.text = convert_half_katakana(event.text)
 
 
+def _tv_preprocess_text(text: str) -> str:
+    # remove audio markers
+    for marker in AUDIO_MARKERS:
+        text = text.removeprefix(marker)
+    text = text.replace("\u3000\u3000", "\u3000").strip()
+    # handle gaiji
+    return GAIJI_PATTERN.sub("", text)
+
+
 def _tv_text_preprocessing(doc: Subtitle) -> None:
     for event in doc.events:
-        # remove audio markers
-        for marker in AUDIO_MARKERS:
-            event.text = event.text.removeprefix(marker)
-        event.text = event.text.replace("\u3000\u3000", "\u3000").strip()
-        # handle gaiji
-        event.text = re.sub(r"\[外：[0-9A-Z]{32}]", "", event.text)
+        event.text = _tv_preprocess_text(event.text)
 
 
-def tv_ass_process(doc: Subtitle, config: ProcessingConfig) -> None:
-    def set_speakers(doc: Subtitle) -> None:
-        speaker_record = defaultdict(set)
+def set_speakers(doc: Subtitle) -> None:
+    speaker_record = defaultdict(set)
 
-        x_spacing = int(60 * doc.res_x / 960)
-        y_spacing = int(60 * doc.res_y / 540)
+    x_spacing = int(60 * doc.res_x / 960)
+    y_spacing = int(60 * doc.res_y / 540)
 
-        none_speaker_count = 1
-        same_speaker_flag = False
+    groups = _speaker_groups(doc.events, x_spacing, y_spacing)
+    group_sizes = Counter(groups)
+    group_names = {}
 
-        for index, event in enumerate(doc.events):
-            speaker = None
-            text_stripped = remove_line_markers(event.text)
-
-            # Find the specific speaker
-            if text_stripped.startswith("（") and "）" in text_stripped:
-                speaker_tmp = re.search(r"（(.*?)）", text_stripped).group(1)
-                if text_stripped[len(speaker_tmp) + 2:].strip() or index + 1 < len(doc.events) and guess_same_speaker(
-                        event, doc.events[index + 1], x_spacing, y_spacing):
-                    speaker = speaker_tmp.strip().removesuffix("の声")
-                    if "：" in speaker:
-                        speaker = speaker[speaker.index("："):].strip()
-                    same_speaker_flag = False
-            elif "：" in text_stripped:
-                speaker = text_stripped[:text_stripped.index("：")].strip()
+    none_speaker_count = 1
+    same_speaker_flag = False
+
+    for index, event in enumerate(doc.events):
+        speaker = None
+        text_stripped = remove_line_markers(event.text)
+
+        # Find the specific speaker
+        if text_stripped.startswith("（") and "）" in text_stripped:
+            speaker_tmp = SPEAKER_PATTERN.search(text_stripped).group(1)
+            if text_stripped[len(speaker_tmp) + 2:].strip() or group_sizes[groups[index]] > 1:
+                speaker = speaker_tmp.strip().removesuffix("の声")
+                if "：" in speaker:
+                    speaker = speaker[speaker.index("："):].strip()
                 same_speaker_flag = False
-            elif "≫" in text_stripped:
-                speaker = text_stripped[:text_stripped.index("≫")].strip()
+        elif "：" in text_stripped:
+            speaker = text_stripped[:text_stripped.index("：")].strip()
+            same_speaker_flag = False
+        elif "≫" in text_stripped:
+            speaker = text_stripped[:text_stripped.index("≫")].strip()
+            same_speaker_flag = False
+
+        if event.color != WHITE:
+            # Set the speaker based on the color
+            if event.color not in speaker_record or speaker and speaker not in speaker_record[event.color]:
+                logger.debug(f"Speaker found for {event.color}: {speaker}")
+            speaker_record[event.color].add(speaker or "")
+            speaker = event.color.to_ass_string()
+        else:
+            # Set the speaker based on parentheses or coordinates
+            text = event.text
+            if same_speaker_flag or index > 0 and doc.events[index - 1].text.endswith(CONTINUOUS_LINE_MARKERS):
+                speaker = doc.events[index - 1].name
+            if text.startswith(PARENTHESIS_START_MARKERS):
+                same_speaker_flag = True
+            if text.endswith(PARENTHESIS_END_MARKERS):
                 same_speaker_flag = False
+            if not speaker and not same_speaker_flag:
+                speaker = group_names.get(groups[index])
 
-            if event.color != WHITE:
-                # Set the speaker based on the color
-                if event.color not in speaker_record or speaker and speaker not in speaker_record[event.color]:
-                    logger.debug(f"Speaker found for {event.color}: {speaker}")
-                speaker_record[event.color].add(speaker or "")
-                speaker = event.color.to_ass_string()
-            else:
-                # Set the speaker based on parentheses or coordinates
-                text = event.text
-                if same_speaker_flag or index > 0 and doc.events[index - 1].text.endswith(CONTINUOUS_LINE_MARKERS):
-                    speaker = doc.events[index - 1].name
-                if text.startswith(PARENTHESIS_START_MARKERS):
-                    same_speaker_flag = True
-                if text.endswith(PARENTHESIS_END_MARKERS):
-                    same_speaker_flag = False
-                if not speaker and not same_speaker_flag and index > 0:
-                    last_event = doc.events[index - 1]
-                    if guess_same_speaker(event, last_event, x_spacing, y_spacing):
-                        speaker = last_event.name
-
-            if speaker:
-                event.name = speaker
-            else:
-                event.name = f"Unknown{none_speaker_count}"
-                none_speaker_count += 1
+        if speaker:
+            event.name = speaker
+        else:
+            event.name = f"Unknown{none_speaker_count}"
+            none_speaker_count += 1
+        if event.color == WHITE:
+            group_names.setdefault(groups[index], event.name)
+
+    # A group whose first line had no known speaker takes the first one found later in the group
+    known_names = {}
+    for group, event in zip(groups, doc.events):
+        if event.color == WHITE and not event.name.startswith("Unknown"):
+            known_names.setdefault(group, event.name)
+    for group, event in zip(groups, doc.events):
+        if event.color == WHITE and event.name.startswith("Unknown") and group in known_names:
+            event.name = known_names[group]
+
+    color_speaker_mapping = {
+        color: max(speakers, key=len) or f"Protagonist{i + 1}"
+        for i, (color, speakers) in enumerate(speaker_record.items())
+    }
+
+    for event in doc.events:
+        if event.color in color_speaker_mapping:
+            event.name = color_speaker_mapping[event.color]
 
-        color_speaker_mapping = {
-            color: max(speakers, key=len) or f"Protagonist{i + 1}"
-            for i, (color, speakers) in enumerate(speaker_record.items())
-        }
 
-        for event in doc.events:
-            if event.color in color_speaker_mapping:
-                event.name = color_speaker_mapping[event.color]
+def _reading_order(event: Dialog) -> tuple:
+    """Sort key placing simultaneous lines top to bottom, then left to right; unpositioned lines go last."""
+    if event.pos is None:
+        return 1, 0, 0
+    return 0, event.pos.y, event.pos.x
 
-    def merge_duplicate_lines_by_time(doc: Subtitle, strategy: MergeStrategy = MergeStrategy.AUTO) -> None:
-        if strategy not in MergeStrategy:
-            raise ValueError(f"Invalid strategy: {strategy}")
 
-        if strategy == MergeStrategy.NONE:
-            return
+def merge_duplicate_lines_by_time(doc: Subtitle, strategy: MergeStrategy = MergeStrategy.AUTO) -> None:
+    """Merge the lines shown with identical timing, wherever they are in the document.
 
-        del_list = []
+    Lines are grouped by ``(start, end)`` in one pass and each group is read in on-screen order, so the
+    result does not depend on the order of the events. Lines of the same speaker are joined into one;
+    with :attr:`MergeStrategy.FORCE` the speakers of a group are joined as well. A merged line takes the
+    place of the first line of its group.
+    """
+    if strategy not in MergeStrategy:
+        raise ValueError(f"Invalid strategy: {strategy}")
 
-        for index in range(len(doc.events) - 1):
-            event = doc.events[index]
-            next_event = doc.events[index + 1]
-            if event.start == next_event.start and event.end == next_event.end:
-                if event.name == next_event.name:
-                    next_event.text = event.text + "\u3000" + next_event.text
-                    del_list.append(index)
-                elif strategy == MergeStrategy.FORCE:
-                    next_event.name = event.name + "/" + next_event.name
-                    next_event.text = event.text + "\n" + next_event.text
-                    del_list.append(index)
+    if strategy == MergeStrategy.NONE:
+        return
 
+    groups = defaultdict(list)
+    for event in doc.events:
+        groups[(event.start, event.end)].append(event)
+
+    merged = Events()
+    for event in doc.events:
+        group = groups.pop((event.start, event.end), None)
+        if group is None:
+            continue  # Already emitted with the first line of its group
+        if len(group) == 1:
+            merged.append(event)
+            continue
+        # Stable sort: lines at the same position keep their document order
+        by_speaker = {}
+        for line in sorted(group, key=_reading_order):
+            by_speaker.setdefault(line.name, []).append(line)
+        lines = []
+        for speaker_lines in by_speaker.values():
+            first = speaker_lines[0]
+            first.text = "\u3000".join(line.text for line in speaker_lines)
+            lines.append(first)
+        if strategy == MergeStrategy.FORCE and len(lines) > 1:
+            first = lines[0]
+            first.name = "/".join(line.name for line in lines)
+            first.text = "\n".join(line.text for line in lines)
+            lines = [first]
+        merged.extend(lines)
+
+    doc.events = merged
+
+
+@register_stage
+class RubiRemoval(Stage):
+    name = "rubi"
+    document = True
+
+    def apply(self, doc: Subtitle) -> None:
+        del_list = [index for index, event in enumerate(doc.events) if event.style == "Rubi"]
         doc.events.pop(del_list)
+        logger.info(f"Removed {len(del_list)} Rubi events")
+
+
+@register_stage
+class FullHalf(Stage):
+    """Full-width/half-width conversion, also turning line breaks into full-width spaces."""
+    name = "full_half"
+    document = True
+    raw = "!?．％／＆＋－＝･“”:〜 ｡。\n"
+    converted = "！？.%/&+-=・「」：～\u3000\u3000\u3000\u3000"
+
+    def compile(self, config: ProcessingConfig) -> None:
+        self.conversion = config.full_half_conversion
+
+    def apply(self, doc: Subtitle) -> None:
+        full_half_conversion(doc, self.conversion, self.raw, self.converted)
+        logger.info("Normalized full-width/half-width characters")
 
-    del_list = [index for index, event in enumerate(doc.events) if event.style == "Rubi"]
-    doc.events.pop(del_list)
-    logger.info(f"Removed {len(del_list)} Rubi events")
 
+@register_stage
+class TVFullHalf(FullHalf):
+    """Full-width/half-width conversion of TV ASS, which keeps line breaks and makes parentheses full-width."""
+    name = "full_half_tv_ass"
     raw = "!?．％／＆＋－＝･“”():〜 ｡。"
     converted = "！？.%/&+-=・「」（）：～\u3000\u3000\u3000"
-    full_half_conversion(doc, config.full_half_conversion, raw, converted)
-    logger.info("Normalized full-width/half-width characters")
 
-    _tv_text_preprocessing(doc)
-    logger.info("Completed text preprocessing")
 
-    set_speakers(doc)
-    logger.info("Assigned speakers")
+@register_stage
+class TVMarkers(Stage):
+    name = "tv_markers"
+    document = True
 
-    for event in doc.events:
-        event.text = remove_line_markers(event.text).strip()
-        for marker in AUDIO_MARKERS:
-            event.text = event.text.removeprefix(marker).strip()
-        if event.text.startswith("（") and "）" in event.text:
-            event.text = event.text[event.text.index("）") + 1:]
-        elif not event.name.startswith("Unknown"):
-            event.text = event.text.removeprefix(event.name + "：").removeprefix(event.name + "≫")
-        for marker in AUDIO_MARKERS:
-            event.text = event.text.removeprefix(marker).strip()
-        event.text = remove_line_markers(event.text).strip()
-        event.text = re.sub(r"(?<=[？！])(?![\u3000？！」』]|$)", "\u3000", event.text)
-    filter_empty_lines(doc)
-    logger.info("Cleaned up text")
-
-    if config.merge_strategy != MergeStrategy.NONE:
-        merge_duplicate_lines_by_time(doc, config.merge_strategy)
+    def apply(self, doc: Subtitle) -> None:
+        _tv_text_preprocessing(doc)
+        logger.info("Completed text preprocessing")
+
+
+@register_stage
+class Speakers(Stage):
+    name = "speakers"
+    stateless = False
+
+    def apply(self, doc: Subtitle) -> None:
+        set_speakers(doc)
+        logger.info("Assigned speakers")
+
+
+@register_stage
+class TVASSCleanup(Stage):
+    """Strips markers and speaker names assigned by the ``speakers`` stage from the text."""
+    name = "tv_ass_cleanup"
+    document = True
+
+    def apply(self, doc: Subtitle) -> None:
+        for event in doc.events:
+            event.text = remove_line_markers(event.text).strip()
+            for marker in AUDIO_MARKERS:
+                event.text = event.text.removeprefix(marker).strip()
+            if event.text.startswith("（") and "）" in event.text:
+                event.text = event.text[event.text.index("）") + 1:]
+            elif not event.name.startswith("Unknown"):
+                event.text = event.text.removeprefix(event.name + "：").removeprefix(event.name + "≫")
+            for marker in AUDIO_MARKERS:
+                event.text = event.text.removeprefix(marker).strip()
+            event.text = remove_line_markers(event.text).strip()
+            event.text = EXCLAMATION_SPACING_PATTERN.sub("\u3000", event.text)
+        filter_empty_lines(doc)
+        logger.info("Cleaned up text")
+
+
+@register_stage
+class MergeByTime(Stage):
+    name = "merge_by_time"
+    stateless = False
+    local = True  # Only events with the same timing, which split_blocks keeps together
+
+    def compile(self, config: ProcessingConfig) -> None:
+        self.strategy = config.merge_strategy
+        self.active = self.strategy != MergeStrategy.NONE
+
+    def apply(self, doc: Subtitle) -> None:
+        merge_duplicate_lines_by_time(doc, self.strategy)
         logger.info("Merged duplicate lines based on timing")
 
 
-def tv_srt_process(doc: Subtitle, config: ProcessingConfig) -> None:
-    raw = "!?．％／＆＋－＝･“”:〜 ｡。\n"
-    converted = "！？.%/&+-=・「」：～\u3000\u3000\u3000\u3000"
-    full_half_conversion(doc, config.full_half_conversion, raw, converted)
-    logger.info("Normalized full-width/half-width characters")
+def _tv_srt_clean_text(text: str) -> str:
+    text = TV_SRT_PARENTHESES_PATTERN.sub("", _tv_preprocess_text(text))
+    text = EXCLAMATION_SPACING_PATTERN.sub("\u3000", text)
+    for marker in AUDIO_MARKERS:
+        text = text.removeprefix(marker).strip()
+    return remove_line_markers(text).strip()
 
-    new_events = []
-    for event in doc.events:
-        splits = TV_SPLIT_PATTERN.split(event.text)
-        for text in splits:
-            for marker in CONTINUOUS_LINE_MARKERS:
-                text = text.replace(marker, "")
-            text = text.strip()
-            if text:
-                new_events.append(Dialog(start=event.start, end=event.end, text=text))
-    doc.events = Events(new_events)
-    logger.info("Split events with special characters")
-
-    _tv_text_preprocessing(doc)
-    logger.info("Completed text preprocessing")
 
-    for event in doc.events:
-        event.text = re.sub(r"\(.*?\)", "", event.text)
-        event.text = re.sub(r"（.*?）", "", event.text)
-        event.text = re.sub(r"(?<=[？！])(?![\u3000？！」』]|$)", "\u3000", event.text)
-        for marker in AUDIO_MARKERS:
-            event.text = event.text.removeprefix(marker).strip()
-        event.text = remove_line_markers(event.text).strip()
-    filter_empty_lines(doc)
-    logger.info("Cleaned up text")
+@register_stage
+class TVSRTSplit(Stage):
+    name = "tv_srt_split"
+    document = True
+
+    def apply(self, doc: Subtitle) -> None:
+        # Splitting and all cleanup steps run in one pass per event
+        new_events = []
+        for event in doc.events:
+            for text in TV_SPLIT_PATTERN.split(event.text):
+                text = CONTINUOUS_LINE_PATTERN.sub("", text).strip()
+                if text:
+                    new_events.append(Dialog(start=event.start, end=event.end, text=_tv_srt_clean_text(text)))
+        doc.events = Events(new_events)
+        filter_empty_lines(doc)
+        logger.info("Split events with special characters and cleaned up text")
+
+
+def _web_clean_text(text: str) -> str:
+    text = WEB_PARENTHESES_PATTERN.sub("", text)
+    text = WEB_LINE_ANNOTATION_PATTERN.sub("", text)
+    text = text.removeprefix("-").strip()
+    text = EXCLAMATION_SPACING_PATTERN.sub("\u3000", text)
+    return remove_affix(text, WEB_PREFIXES, WEB_SUFFIXES)
+
+
+@register_stage
+class WebSplit(Stage):
+    name = "web_split"
+    document = True
+
+    def apply(self, doc: Subtitle) -> None:
+        # Splitting and all cleanup steps run in one pass per event
+        new_events = []
+        for event in doc.events:
+            text = WEB_TAG_PATTERN.sub("", event.text)
+            if "\u3000-" in text or "\u3000（" in text:
+                for part in WEB_SPLIT_PATTERN.split(text):
+                    part = part.strip()
+                    if part:
+                        new_events.append(Dialog(start=event.start, end=event.end, text=_web_clean_text(part)))
+            else:
+                event.text = _web_clean_text(text)
+                new_events.append(event)
+        doc.events = Events(new_events)
+        filter_empty_lines(doc)
+        logger.info("Split events with special characters and cleaned up text")
+
+
+@register_stage
+class WebDuplicates(Stage):
+    """Extends a line over the next one when that repeats it right where it ends."""
+    name = "web_duplicates"
+    stateless = False
+    local = True  # split_blocks keeps a line and the one starting where it ends together
+
+    def apply(self, doc: Subtitle) -> None:
+        del_list = []
+        for index, event in enumerate(doc.events):
+            if index == 0:
+                continue
+            last_event = doc.events[index - 1]
+            if event.start == last_event.end and event.text == last_event.text:
+                last_event.end = doc.events[index].end
+                del_list.append(index)
+        doc.events.pop(del_list)
+        logger.info(f"Removed {len(del_list)} duplicate events")
+
+
+def tv_ass_process(doc: Subtitle, config: ProcessingConfig) -> None:
+    compile_passes(config, SubtitleType.TV_ASS)(doc)
+
+
+def tv_srt_process(doc: Subtitle, config: ProcessingConfig) -> None:
+    compile_passes(config, SubtitleType.TV_SRT)(doc)
 
 
 def web_process(doc: Subtitle, config: ProcessingConfig) -> None:
-    raw = "!?．％／＆＋－＝･“”:〜 ｡。\n"
-    converted = "！？.%/&+-=・「」：～\u3000\u3000\u3000\u3000"
-    full_half_conversion(doc, config.full_half_conversion, raw, converted)
-    logger.info("Normalized full-width/half-width characters")
+    compile_passes(config, SubtitleType.WEB)(doc)
 
-    new_events = []
-    for event in doc.events:
-        event.text = re.sub(r"<.*?>", "", event.text)
-        event.text = re.sub(r"{.*?}", "", event.text)
-        if "\u3000-" in event.text or "\u3000（" in event.text:
-            splits = re.split("\u3000(?=[-（])", event.text)
-            for text in splits:
-                text = text.strip()
-                if text:
-                    new_events.append(Dialog(start=event.start, end=event.end, text=text))
-        else:
-            new_events.append(event)
-    doc.events = Events(new_events)
-    logger.info("Split events with special characters")
 
-    prefixes = ("〈", "・～", "♪～", "♪")
-    suffixes = ("〉", "～・", "～♪", "♪", "⸺")
+def _dedup_key(text: str) -> str:
+    return WHITESPACE_PATTERN.sub("", unicodedata.normalize("NFKC", text))
+
+
+def collapse_repeated_lines(doc: Subtitle, window: int = 3, tolerance: int = 500) -> int:
+    """Drop lines that repeat one of the ``window`` preceding lines and start at most ``tolerance`` ms
+    after it ends, extending the earlier line instead. Returns the number of dropped lines.
+
+    A hash index maps normalized text to the latest kept line with that text, so the pass is linear.
+    Lines attributed to different speakers are never collapsed.
+    """
+    kept = Events()
+    latest = {}
     for event in doc.events:
-        event.text = re.sub(r"\(.*?\)", "", event.text)
-        event.text = re.sub(r"^〔.*?〕$", "", event.text)
-        event.text = re.sub(r"^(?:- ?)?（.*?）", "", event.text)
-        event.text = event.text.removeprefix("-").strip()
-        event.text = re.sub(r"(?<=[？！])(?![\u3000？！」』]|$)", "\u3000", event.text)
-        event.text = remove_affix(event.text, prefixes, suffixes)
-    filter_empty_lines(doc)
-    logger.info("Cleaned up text")
-
-    del_list = []
-    for index, event in enumerate(doc.events):
-        if index == 0:
-            continue
-        last_event = doc.events[index - 1]
-        if event.start == last_event.end and event.text == last_event.text:
-            last_event.end = doc.events[index].end
-            del_list.append(index)
-    doc.events.pop(del_list)
-    logger.info(f"Removed {len(del_list)} duplicate events")
+        key = _dedup_key(event.text)
+        position = latest.get(key)
+        if position is not None and position >= len(kept) - window:
+            previous = kept[position]
+            if previous.start <= event.start <= previous.end + tolerance and previous.name == event.name:
+                previous.end = max(previous.end, event.end)
+                continue
+        latest[key] = len(kept)
+        kept.append(event)
+
+    removed = len(doc.events) - len(kept)
+    doc.events = kept
+    return removed
+
+
+def split_blocks(events: Events, type_: SubtitleType) -> list[range]:
+    """Cut prepared events into runs that :meth:`Processor.finish` can process independently.
+
+    TV ASS merges events with identical timing and web subtitles merge a repeated line into the one
+    ending where it starts, so the events on both sides of such a link always share a block.
+    """
+    reach = list(range(len(events)))  # Furthest index each event is linked to
+    first_index = {}
+    for index, event in enumerate(events):
+        if type_ == SubtitleType.TV_ASS:
+            first = first_index.setdefault((event.start, event.end), index)
+            reach[first] = index
+        elif type_ == SubtitleType.WEB:
+            first = first_index.get(event.start)
+            if first is not None:
+                reach[first] = index
+            first_index.setdefault(event.end, index)
+
+    blocks = []
+    block_start = 0
+    furthest = -1
+    for index in range(len(events)):
+        furthest = max(furthest, reach[index])
+        if furthest == index:
+            blocks.append(range(block_start, index + 1))
+            block_start = index + 1
+    return blocks
+
+
+def text_pipeline_fingerprint(config: ProcessingConfig, disabled_regex: tuple[str, ...] = ()) -> tuple:
+    """Hashable summary of every setting that affects :meth:`Processor.normalize_text`."""
+    return (
+        config.filter_interjections,
+        config.cjk_spacing.enabled,
+        config.cjk_spacing.space_char,
+        config.repetition_adjustment.enabled,
+        config.repetition_adjustment.connector,
+        tuple(config.mapping.text.items()),
+        tuple(config.mapping.regex.items()),
+        tuple(config.stages),
+        disabled_regex,
+    )
+
+
+def _as_suffix(input_format: str | None) -> str | None:
+    return f".{input_format.lstrip('.').lower()}" if input_format else None
 
 
 class Processor:
     def __init__(self, config: ProcessingConfig | None = None):
         self.config = config or ProcessingConfig()
+        self.stages = compile_stages(self.config)
+        self.passes = {type_: compile_passes(self.config, type_) for type_ in SubtitleType}
+        self.regex_rules = self.stages.regex_rules or StaticRegexRules(Mapping())
+        self._fingerprint = text_pipeline_fingerprint(self.config)
+        self._normalize_cached = self._make_text_cache(self.config.text_cache_size)
+        # Recurring blocks of the current batch, see RecurringIndex.build
+        self.recurring: RecurringIndex | None = None
 
     def set_config(self, config: ProcessingConfig) -> None:
         self.config = config
+        self.stages = compile_stages(config)
+        self.passes = {type_: compile_passes(config, type_) for type_ in SubtitleType}
+        self.regex_rules = self.stages.regex_rules or StaticRegexRules(Mapping())
+        self._fingerprint = text_pipeline_fingerprint(config)
+        if config.text_cache_size != self._normalize_cached.cache_parameters()["maxsize"]:
+            self._normalize_cached = self._make_text_cache(config.text_cache_size)
+
+    def _make_text_cache(self, maxsize: int):
+        # The fingerprint is only part of the key: entries made under another configuration never match
+        return lru_cache(maxsize=maxsize)(lambda text, fingerprint: self.normalize_text(text))
+
+    def text_cache_info(self):
+        """Hit/miss statistics of the per-line text cache, shared by every file this processor handles."""
+        return self._normalize_cached.cache_info()
+
+    def compile(self) -> "CompiledProcessor":
+        """Immutable copy of this processor that threads can share, see :class:`CompiledProcessor`."""
+        return CompiledProcessor(self.config, self.recurring)
 
     @overload
     def __call__(self, doc: Subtitle) -> None:
@@ -313,21 +599,117 @@ class Processor:
                 logger.error(f"Error processing file {doc_or_path}: {e}")
                 raise ValueError(f"Error processing file {doc_or_path}: {e}")
 
-    def process_and_save(self, path: Path | str) -> None:
+    def process_and_save(self, path: Path | str, memory: MemoryUsage | None = None,
+                         on_processed: Callable[[Subtitle], None] | None = None) -> Path:
+        """Process a file and write the output next to it or to the output directory.
+
+        When ``memory`` is given, the peak allocations of each phase are recorded into it.
+        ``on_processed`` is called with the processed document before it is saved.
+        """
         logger.info(f"Starting processing {path}")
         path = Path(path)
-        doc = Subtitle.load(path)
-        self.process_subtitle(doc)
-        output_filename = path.with_name(f"{path.stem}_processed.{self.config.output.format}").name
+        with track_phase(memory, "parse"):
+            doc = self.load(path)
         output_dir = self.config.output.dir or path.parent
         output_dir.mkdir(parents=True, exist_ok=True)
-        output_path = output_dir / output_filename
-        doc.save(output_path, self.config.output)
+        output_path = output_dir / self.output_filename(path)
+        if memory is not None:
+            memory.events_in = len(doc.events)
+        with track_phase(memory, "process"):
+            self.process_for_output(doc, output_path)
+        if memory is not None:
+            memory.events_out = len(doc.events)
+        doc = self.attach_tracks(doc, path)
+        if on_processed is not None:
+            on_processed(doc)
+        with track_phase(memory, "save"):
+            doc.save(output_path, self.config.output)
         logger.info(f"Finished processing. Saved to {output_path}")
+        return output_path
+
+    def process_for_output(self, doc: Subtitle, output_path: Path) -> None:
+        """Process ``doc`` to be saved as ``output_path``, incrementally against the sidecar of
+        ``output_path`` when ``incremental`` is set."""
+        if self.config.incremental:
+            from .incremental import process_incrementally, sidecar_path
+            process_incrementally(self, doc, sidecar_path(output_path))
+        else:
+            self.process_subtitle(doc)
+
+    def load(self, path: Path | str) -> Subtitle:
+        """Load an input file, or only the part of it within the configured ``time_range``."""
+        time_range = self.config.time_range
+        return Subtitle.load(path, start=time_range.start, end=time_range.end)
+
+    def process_text(self, text: str, input_format: str | None = None,
+                     output: OutputSettings | None = None) -> str:
+        """Parse, process and serialize subtitle text without touching the filesystem.
+
+        ``input_format`` is a suffix such as ``"srt"`` or ``".srt"``; it is sniffed from the text when
+        omitted. ``output`` defaults to the configured output settings. Like :meth:`process_bytes`, this
+        may be called from several threads at once as long as :meth:`set_config` is not.
+        """
+        output = output or self.config.output
+        doc = Subtitle.from_text(text, _as_suffix(input_format))
+        self.process_subtitle(doc)
+        return doc.dumps(f".{output.format}", output)
+
+    def process_bytes(self, data: bytes, input_format: str | None = None,
+                      output: OutputSettings | None = None, encoding: str = "utf-8") -> bytes:
+        """Bytes variant of :meth:`process_text`, also handling the binary format and compression."""
+        output = output or self.config.output
+        doc = Subtitle.from_bytes(data, _as_suffix(input_format), encoding)
+        self.process_subtitle(doc)
+        return self.serialize(doc, output)
+
+    def serialize(self, doc: Subtitle, output: OutputSettings | None = None) -> bytes:
+        """Output file content of ``doc``, compressed if the output settings ask for it."""
+        output = output or self.config.output
+        data = doc.to_bytes(f".{output.format}", output)
+        if output.compression != Compression.NONE:
+            data = compress(data, f".{output.compression}")
+        return data
+
+    def attach_tracks(self, doc: Subtitle, path: Path) -> Subtitle:
+        """Retime ``doc`` against the reference track of the input ``path`` and merge the
+        ``output.align_with`` track into it as second lines, as far as configured."""
+        if reference_path := self._track_path(self.config.retiming.reference, path):
+            from .retime import retime
+            retiming = self.config.retiming
+            retime(doc, Subtitle.load(reference_path), retiming.resolution, retiming.max_offset, retiming.drift)
+        if secondary_path := self._track_path(self.config.output.align_with, path):
+            from .align import align
+            doc = align(doc, Subtitle.load(secondary_path))
+        return doc
+
+    @staticmethod
+    def _track_path(template: str, path: Path) -> Path | None:
+        if not template:
+            return None
+        track_path = Path(template.format(dir=path.parent, stem=path.stem))
+        if not track_path.is_file():
+            logger.warning(f"Track for {path.name} not found: {track_path}")
+            return None
+        return track_path
+
+    def output_filename(self, path: Path | str) -> str:
+        path, _ = split_compression(path)
+        output = self.config.output
+        suffix = f".{output.compression}" if output.compression != Compression.NONE else ""
+        return f"{path.stem}_processed.{output.format}{suffix}"
 
     def process_subtitle(self, doc: Subtitle, type_: SubtitleType | str | None = None) -> None:
         logger.info("Starting subtitle processing...")
+        doc.crop(self.config.time_range.start, self.config.time_range.end)
+        type_ = self.detect_type(doc, type_)
+        recurring = self.recurring_ranges(doc)
+        self.prepare(doc, type_)
+        self.finish(doc, type_)
+        self.finalize(doc, recurring)
+        logger.info("Subtitle processing completed successfully")
 
+    @staticmethod
+    def detect_type(doc: Subtitle, type_: SubtitleType | str | None = None) -> SubtitleType:
         if type_ is None:
             default_position = Position(0, 0)
             if any(event.pos is not None and event.pos != default_position for event in doc.events):
@@ -344,43 +726,95 @@ class Processor:
                 raise ValueError(f"Invalid subtitle type {type_}")
 
         logger.info(f"Detected subtitle type: {type_.value}")
-
-        if type_ == SubtitleType.TV_ASS:
-            tv_ass_process(doc, self.config)
-        elif type_ == SubtitleType.TV_SRT:
-            tv_srt_process(doc, self.config)
-        elif type_ == SubtitleType.WEB:
-            web_process(doc, self.config)
-
+        return type_
+
+    def prepare(self, doc: Subtitle, type_: SubtitleType) -> None:
+        """Type-specific passes that need the whole document, such as speaker assignment.
+
+        Everything after them only relates events that :func:`split_blocks` keeps in one block.
+        """
+        self.passes[type_].prepare(doc)
+
+    def finish(self, doc: Subtitle, type_: SubtitleType) -> None:
+        self.passes[type_].finish(doc)
+        self.normalize_events(doc)
+
+    def recurring_ranges(self, doc: Subtitle) -> list[tuple[int, int]]:
+        """Time ranges of recurring blocks in the raw ``doc``, for :meth:`finalize`."""
+        if self.recurring is None or self.config.recurring.action == RecurringAction.KEEP:
+            return []
+        return self.recurring.ranges(doc)
+
+    def finalize(self, doc: Subtitle, recurring: Sequence[tuple[int, int]] = ()) -> None:
+        """Cheap whole-document passes over the processed events.
+
+        ``recurring`` are the time ranges found by :meth:`recurring_ranges` before processing.
+        """
+        self.stages.apply_document(doc)
+        if recurring:
+            drop = self.config.recurring.action == RecurringAction.DROP
+            marked = mark_recurring(doc, recurring, drop)
+            logger.info(f"{'Dropped' if drop else 'Tagged'} {marked} lines of recurring blocks")
+
+    def normalize_text(self, text: str) -> str | None:
+        """Run the stateless stages on one line. Returns None if the line should be dropped."""
+        disabled = self.regex_rules.disabled_patterns
+        text = self.stages.apply_text(text)
+        if self.regex_rules.disabled_patterns != disabled:
+            # Lines cached from now on were produced without the disabled rule
+            self._fingerprint = text_pipeline_fingerprint(self.config, self.regex_rules.disabled_patterns)
+        return text
+
+    def normalize_events(self, doc: Subtitle) -> None:
+        kept = []
         for event in doc.events:
-            event.text = re.sub("\u3000+", "\u3000", event.text).replace(
-                "⁉", "!?").replace("⁈", "?!").replace("‼", "!!")
+            text = self._normalize_cached(event.text, self._fingerprint)
+            if text is not None:
+                event.text = text
+                kept.append(event)
+        if len(kept) != len(doc.events):
+            logger.info(f"Filtered {len(doc.events) - len(kept)} events emptied by the text stages")
+        doc.events = Events(kept)
+        logger.info(f"Normalized text ({', '.join(self.stages.names)})")
+
+
+class CompiledProcessor(Processor):
+    """A :class:`Processor` that many threads can use at the same time.
+
+    The configuration is deep-copied and frozen (see :func:`~.config.freeze`) when compiling, so neither
+    the caller nor a stage can change it during a run. Regex mappings run without time accounting (see
+    :class:`StaticRegexRules`), and every thread gets its own text cache. Processing therefore touches no
+    shared mutable state: each call only mutates the document it is given.
+    """
+
+    def __init__(self, config: ProcessingConfig | None = None, recurring: RecurringIndex | None = None):
+        config = freeze(copy.deepcopy(config or ProcessingConfig()))
+        object.__setattr__(self, "config", config)
+        stages = compile_stages(config, static=True)
+        object.__setattr__(self, "stages", stages)
+        passes = {type_: compile_passes(config, type_, static=True) for type_ in SubtitleType}
+        object.__setattr__(self, "passes", passes)
+        object.__setattr__(self, "regex_rules", stages.regex_rules or StaticRegexRules(Mapping()))
+        object.__setattr__(self, "recurring", recurring)
+        object.__setattr__(self, "_fingerprint", text_pipeline_fingerprint(config))
+        object.__setattr__(self, "_local", threading.local())
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
 
-        if self.config.filter_interjections:
-            for event in doc.events:
-                event.text = filter_interjections(event.text)
-            filter_empty_lines(doc)
-            logger.info("Filtered interjections")
-
-        if self.config.cjk_spacing.enabled:
-            for event in doc.events:
-                event.text = cjk_spacing(event.text, self.config.cjk_spacing.space_char)
-            logger.info("Applied CJK spacing adjustments")
-
-        if self.config.repetition_adjustment.enabled:
-            for event in doc.events:
-                event.text = adjust_repeated_syllables(event.text, self.config.repetition_adjustment.connector)
-            logger.info("Adjusted repeated syllables")
+    def set_config(self, config: ProcessingConfig) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable, compile a new one instead")
 
-        for event in doc.events:
-            for key, value in self.config.mapping.text.items():
-                event.text = event.text.replace(key, value)
-            for pattern, replacement in self.config.mapping.regex.items():
-                event.text = re.sub(pattern, replacement, event.text)
-        logger.info(f"Finished custom text replacements")
+    @property
+    def _normalize_cached(self):
+        cache = getattr(self._local, "cache", None)
+        if cache is None:
+            cache = self._local.cache = self._make_text_cache(self.config.text_cache_size)
+        return cache
 
-        for event in doc.events:
-            event.text = fix_western_text(event.text)
-        logger.info(f"Fixed western text")
+    def text_cache_info(self):
+        """Hit/miss statistics of the calling thread's text cache."""
+        return self._normalize_cached.cache_info()
 
-        logger.info("Subtitle processing completed successfully")
+    def compile(self) -> "CompiledProcessor":
+        return self
@@ -0,0 +1,117 @@
+import bisect
+import hashlib
+import re
+import unicodedata
+from collections import Counter
+from collections.abc import Iterable, Iterator, Sequence
+from dataclasses import dataclass
+
+from .subtitle import Subtitle, Dialog
+from .subtitle.events import RECURRING_STYLE
+
+__all__ = (
+    "RecurringIndex",
+    "mark_recurring",
+)
+
+# Polynomial rolling hash over line hashes, modulo a Mersenne prime
+MODULUS = (1 << 61) - 1
+BASE = 0x5BD1E995
+
+NON_WORD_PATTERN = re.compile(r"[\W_]+")
+
+
+def _line_hash(event: Dialog) -> int | None:
+    """Stable hash of the text of a raw event, ignoring width, spacing, punctuation and ♪ marks."""
+    if event.style == "Rubi":
+        return None
+    key = NON_WORD_PATTERN.sub("", unicodedata.normalize("NFKC", event.text))
+    if not key:
+        return None
+    # Python's str hash differs between processes, and workers must agree with the main process
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little") % MODULUS
+
+
+def _window_hashes(hashes: Sequence[int], size: int) -> Iterator[int]:
+    """Hash of every run of ``size`` consecutive lines, each computed from the previous one in O(1)."""
+    if len(hashes) < size:
+        return
+    power = pow(BASE, size - 1, MODULUS)
+    value = 0
+    for i, line in enumerate(hashes):
+        if i >= size:
+            value = (value - hashes[i - size] * power) % MODULUS
+        value = (value * BASE + line) % MODULUS
+        if i >= size - 1:
+            yield value
+
+
+def _hashed_lines(doc: Subtitle) -> tuple[list[Dialog], list[int]]:
+    events, hashes = [], []
+    for event in doc.events:
+        line = _line_hash(event)
+        if line is not None:
+            events.append(event)
+            hashes.append(line)
+    return events, hashes
+
+
+@dataclass(frozen=True)
+class RecurringIndex:
+    """Runs of ``min_lines`` consecutive lines that occur in several files of a batch, such as the
+    opening and ending songs of a season, stored as rolling hashes of raw event texts."""
+    windows: frozenset[int]
+    min_lines: int = 4
+
+    @classmethod
+    def build(cls, docs: Iterable[Subtitle], min_lines: int = 4, min_files: int = 3) -> "RecurringIndex":
+        """Index the runs occurring in at least ``min_files`` of ``docs``, in time linear in their size."""
+        files = Counter()
+        for doc in docs:
+            files.update(set(_window_hashes(_hashed_lines(doc)[1], min_lines)))
+        return cls(frozenset(window for window, count in files.items() if count >= min_files), min_lines)
+
+    def __len__(self) -> int:
+        return len(self.windows)
+
+    def ranges(self, doc: Subtitle) -> list[tuple[int, int]]:
+        """Time ranges of ``doc`` covered by recurring runs, merged and in order. Use on the raw document."""
+        events, hashes = _hashed_lines(doc)
+        ranges = []
+        covered_until = -1  # Index of the last line covered by a run found so far
+        for first, window in enumerate(_window_hashes(hashes, self.min_lines)):
+            if window not in self.windows:
+                continue
+            last = first + self.min_lines - 1
+            if first > covered_until:
+                ranges.append([events[first].start, events[last].end])
+            else:
+                ranges[-1][1] = max(ranges[-1][1], events[last].end)
+            covered_until = last
+        # Runs are merged in line order; with events out of time order they can still overlap in time
+        merged = []
+        for start, end in sorted(ranges):
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+
+def mark_recurring(doc: Subtitle, ranges: Sequence[tuple[int, int]], drop: bool = True) -> int:
+    """Drop the events whose midpoint lies in one of the sorted, non-overlapping ``ranges``, or tag them
+    with the ``Recurring`` style. Returns the number of affected events."""
+    starts = [start for start, _ in ranges]
+    kept = []
+    marked = 0
+    for event in doc.events:
+        middle = (event.start + event.end) / 2
+        i = bisect.bisect_right(starts, middle) - 1
+        if i >= 0 and middle <= ranges[i][1]:
+            marked += 1
+            if drop:
+                continue
+            event.style = RECURRING_STYLE
+        kept.append(event)
+    doc.events[:] = kept
+    return marked
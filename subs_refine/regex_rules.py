@@ -0,0 +1,284 @@
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+
+from re import _constants as sre_constants, _parser as sre_parse
+
+from .config import Mapping, RegexBudgetAction
+
+__all__ = (
+    "RegexRule",
+    "RegexRuleSet",
+    "StaticRegexRules",
+    "check_regex",
+    "find_backtracking_risk",
+)
+
+logger = logging.getLogger(__name__)
+
+UNBOUNDED = sre_constants.MAXREPEAT
+REPEAT_OPS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT}
+UNIVERSE = ((0, 0x10FFFF),)
+
+
+def _complement(ranges) -> tuple[tuple[int, int], ...]:
+    """Code point ranges of :data:`UNIVERSE` outside ``ranges``."""
+    result = []
+    low = UNIVERSE[0][0]
+    for lo, hi in sorted(ranges):
+        if lo > low:
+            result.append((low, lo - 1))
+        low = max(low, hi + 1)
+    if low <= UNIVERSE[0][1]:
+        result.append((low, UNIVERSE[0][1]))
+    return tuple(result)
+
+
+# Predicates of the positive categories in str patterns, as defined by the sre engine
+CATEGORY_PREDICATES = {
+    sre_constants.CATEGORY_DIGIT: (str.isdecimal, "0123456789"),
+    sre_constants.CATEGORY_SPACE: (str.isspace, " \t\n\r\f\v"),
+    sre_constants.CATEGORY_WORD: (lambda c: c.isalnum() or c == "_",
+                                  "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz"),
+}
+NEGATED_CATEGORIES = {
+    sre_constants.CATEGORY_NOT_DIGIT: sre_constants.CATEGORY_DIGIT,
+    sre_constants.CATEGORY_NOT_SPACE: sre_constants.CATEGORY_SPACE,
+    sre_constants.CATEGORY_NOT_WORD: sre_constants.CATEGORY_WORD,
+}
+
+
+@lru_cache(maxsize=None)
+def _category_ranges(category, ascii: bool) -> tuple[tuple[int, int], ...]:
+    """Exact code point ranges of a category such as ``\\d``, with or without the ASCII flag."""
+    if category in NEGATED_CATEGORIES:
+        return _complement(_category_ranges(NEGATED_CATEGORIES[category], ascii))
+    if category not in CATEGORY_PREDICATES:
+        return UNIVERSE
+    predicate, ascii_chars = CATEGORY_PREDICATES[category]
+    codes = map(ord, ascii_chars) if ascii else (code for code in range(0x110000) if predicate(chr(code)))
+    ranges = []
+    for code in codes:
+        if ranges and ranges[-1][1] == code - 1:
+            ranges[-1][1] = code
+        else:
+            ranges.append([code, code])
+    return tuple((lo, hi) for lo, hi in ranges)
+
+
+def _class_ranges(items, ascii: bool) -> tuple[tuple[int, int], ...]:
+    ranges = []
+    negate = False
+    for op, av in items:
+        if op == sre_constants.NEGATE:
+            negate = True
+        elif op == sre_constants.LITERAL:
+            ranges.append((av, av))
+        elif op == sre_constants.RANGE:
+            ranges.append(av)
+        elif op == sre_constants.CATEGORY:
+            ranges.extend(_category_ranges(av, ascii))
+        else:
+            return UNIVERSE
+    return _complement(ranges) if negate else tuple(ranges)
+
+
+def _group_ascii(av, ascii: bool) -> bool:
+    """Whether the ASCII flag applies inside a group, which may set or clear it as in ``(?a:...)``."""
+    _, add_flags, del_flags, _ = av
+    return (ascii or bool(add_flags & sre_constants.SRE_FLAG_ASCII)) and not del_flags & sre_constants.SRE_FLAG_ASCII
+
+
+def _first(items, ascii: bool) -> tuple[tuple[tuple[int, int], ...], bool]:
+    """Code point ranges a sequence can start with, and whether it can match the empty string."""
+    result = []
+    for op, av in items:
+        if op == sre_constants.LITERAL:
+            chars, nullable = ((av, av),), False
+        elif op == sre_constants.NOT_LITERAL:
+            chars, nullable = _complement([(av, av)]), False
+        elif op == sre_constants.IN:
+            chars, nullable = _class_ranges(av, ascii), False
+        elif op == sre_constants.SUBPATTERN:
+            chars, nullable = _first(av[-1], _group_ascii(av, ascii))
+        elif op == sre_constants.ATOMIC_GROUP:
+            chars, nullable = _first(av, ascii)
+        elif op == sre_constants.BRANCH:
+            firsts = [_first(branch, ascii) for branch in av[1]]
+            chars = tuple(r for branch_chars, _ in firsts for r in branch_chars)
+            nullable = any(branch_nullable for _, branch_nullable in firsts)
+        elif op in REPEAT_OPS or op == sre_constants.POSSESSIVE_REPEAT:
+            chars, nullable = _first(av[2], ascii)
+            nullable = nullable or av[0] == 0
+        elif op in (sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            continue
+        else:  # ANY, back references
+            return UNIVERSE, False
+        result.extend(chars)
+        if not nullable:
+            return tuple(result), False
+    return tuple(result), True
+
+
+def _first_chars(items, ascii: bool = False) -> tuple[tuple[int, int], ...]:
+    """Code point ranges a sub-pattern can start with. Categories, classes and optional prefixes are
+    exact; a sub-pattern that can match the empty string may be followed by anything."""
+    chars, nullable = _first(items, ascii)
+    return UNIVERSE if nullable else chars
+
+
+def _overlaps(a, b) -> bool:
+    return any(lo1 <= hi2 and lo2 <= hi1 for lo1, hi1 in a for lo2, hi2 in b)
+
+
+def _contains_unbounded_repeat(items) -> bool:
+    for op, av in items:
+        if op in REPEAT_OPS:
+            if av[1] == UNBOUNDED or _contains_unbounded_repeat(av[2]):
+                return True
+        elif op == sre_constants.SUBPATTERN:
+            if _contains_unbounded_repeat(av[-1]):
+                return True
+        elif op == sre_constants.BRANCH:
+            if any(_contains_unbounded_repeat(branch) for branch in av[1]):
+                return True
+    return False
+
+
+def _find_risk(items, in_repeat: bool, ascii: bool = False) -> str | None:
+    for op, av in items:
+        if op in REPEAT_OPS:
+            low, high, body = av
+            repeats = high == UNBOUNDED or high > 1
+            if repeats and _contains_unbounded_repeat(body):
+                return "nested quantifiers, e.g. (a+)+"
+            if repeats:
+                for sub_op, sub_av in body:
+                    if sub_op == sre_constants.SUBPATTERN:
+                        target, inner_ascii = sub_av[-1], _group_ascii(sub_av, ascii)
+                    else:
+                        target, inner_ascii = [(sub_op, sub_av)], ascii
+                    for inner_op, inner_av in target:
+                        if inner_op == sre_constants.BRANCH:
+                            firsts = [_first_chars(branch, inner_ascii) for branch in inner_av[1]]
+                            if any(_overlaps(a, b) for i, a in enumerate(firsts) for b in firsts[i + 1:]):
+                                return "quantified alternation with overlapping branches, e.g. (a|ab)*"
+            risk = _find_risk(body, in_repeat or repeats, ascii)
+        elif op == sre_constants.SUBPATTERN:
+            risk = _find_risk(av[-1], in_repeat, _group_ascii(av, ascii))
+        elif op == sre_constants.BRANCH:
+            risk = next(filter(None, (_find_risk(branch, in_repeat, ascii) for branch in av[1])), None)
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            risk = _find_risk(av[1], in_repeat, ascii)
+        else:
+            risk = None
+        if risk:
+            return risk
+    return None
+
+
+def find_backtracking_risk(pattern: str) -> str | None:
+    """Describe a pattern shape known to backtrack exponentially, or return None.
+
+    This is a static heuristic over the parsed pattern: it reports nested unbounded quantifiers and
+    repeated alternations whose branches can start with the same character. Atomic groups and
+    possessive quantifiers are treated as safe.
+    """
+    parsed = sre_parse.parse(pattern)
+    return _find_risk(parsed, False, bool(parsed.state.flags & sre_constants.SRE_FLAG_ASCII))
+
+
+@lru_cache(maxsize=None)
+def check_regex(pattern: str) -> str | None:
+    """Compile ``pattern``, raising ValueError if it is invalid, and return its backtracking risk.
+
+    Results are cached, so each risky pattern is only reported once per process.
+    """
+    try:
+        re.compile(pattern)
+    except re.error as e:
+        raise ValueError(f"Invalid regex mapping {pattern!r}: {e}") from None
+    risk = find_backtracking_risk(pattern)
+    if risk:
+        logger.warning(f"Regex mapping {pattern!r} may backtrack catastrophically: {risk}")
+    return risk
+
+
+@dataclass
+class RegexRule:
+    pattern: str
+    replacement: str
+    compiled: re.Pattern
+    calls: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+    disabled: bool = False
+    flagged: bool = False
+
+
+class RegexRuleSet:
+    """The compiled ``mapping.regex`` rules with per-rule time accounting.
+
+    When a single application of a rule takes longer than ``time_budget`` milliseconds, the rule is
+    disabled for the rest of the run or only flagged, depending on ``action``. A running match cannot
+    be interrupted, so the budget keeps a slow rule from being repeated on every following line;
+    shapes that hang outright are caught by :func:`check_regex` when the configuration is loaded.
+    The statistics are updated under a lock, so one rule set can serve several threads.
+    """
+
+    def __init__(self, mapping: Mapping):
+        self.time_budget = mapping.regex_time_budget / 1000
+        self.action = mapping.regex_budget_action
+        self._lock = threading.Lock()
+        self.rules = [RegexRule(pattern, replacement, re.compile(pattern))
+                      for pattern, replacement in mapping.regex.items()]
+
+    @property
+    def disabled_patterns(self) -> tuple[str, ...]:
+        return tuple(rule.pattern for rule in self.rules if rule.disabled)
+
+    def apply(self, text: str) -> str:
+        for rule in self.rules:
+            if rule.disabled:
+                continue
+            start = time.perf_counter()
+            text = rule.compiled.sub(rule.replacement, text)
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                rule.calls += 1
+                rule.total_time += elapsed
+                rule.max_time = max(rule.max_time, elapsed)
+                if not (self.time_budget and elapsed > self.time_budget and not rule.flagged):
+                    continue
+                rule.flagged = True
+                rule.disabled = self.action == RegexBudgetAction.DISABLE
+            logger.warning(f"Regex mapping {rule.pattern!r} took {elapsed * 1000:.3g} ms on a "
+                           f"{len(text)}-character line, over the {self.time_budget * 1000:g} ms budget"
+                           + ("; disabled for the rest of the run" if rule.disabled else ""))
+        return text
+
+    def log_stats(self) -> None:
+        for rule in self.rules:
+            logger.info(f"Regex mapping {rule.pattern!r}: {rule.calls} calls, {rule.total_time * 1000:.3g} ms total, "
+                        f"{rule.max_time * 1000:.3g} ms max" + (" (disabled)" if rule.disabled else
+                                                                 " (over budget)" if rule.flagged else ""))
+
+
+class StaticRegexRules:
+    """The compiled ``mapping.regex`` rules without time accounting or budget, so nothing changes after
+    construction and one instance can be shared by any number of threads."""
+    disabled_patterns: tuple[str, ...] = ()
+
+    def __init__(self, mapping: Mapping):
+        self.rules = tuple((re.compile(pattern), replacement) for pattern, replacement in mapping.regex.items())
+
+    def apply(self, text: str) -> str:
+        for compiled, replacement in self.rules:
+            text = compiled.sub(replacement, text)
+        return text
+
+    def log_stats(self) -> None:
+        pass
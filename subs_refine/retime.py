@@ -0,0 +1,110 @@
+import logging
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+from .subtitle import Dialog, Subtitle
+from .subtitle.types import Timecode
+
+__all__ = (
+    "TimeShift",
+    "activity_signal",
+    "estimate_shift",
+    "retime",
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TimeShift:
+    """Linear time correction ``t' = t + offset + drift * t``, with times in milliseconds."""
+    offset: int = 0
+    drift: float = 0.0  # Milliseconds gained per millisecond
+
+    def apply(self, events: Sequence[Dialog]) -> None:
+        """Shift all events in place. Times that would become negative are clamped to 0."""
+        import numpy as np
+
+        if not events:
+            return
+        times = np.array([(event.start, event.end) for event in events], dtype=np.float64)
+        shifted = np.maximum(np.rint(times + self.offset + self.drift * times), 0).astype(np.int64)
+        for event, (start, end) in zip(events, shifted.tolist()):
+            event.start = Timecode(start)
+            event.end = Timecode(end)
+
+
+def activity_signal(events: Sequence[Dialog], resolution: int, length: int):
+    """Zero-mean on/off signal with one sample per ``resolution`` ms: positive while any event is shown."""
+    import numpy as np
+
+    times = np.array([(event.start, event.end) for event in events], dtype=np.int64).reshape(-1, 2)
+    buckets = np.clip(times // resolution, 0, length)
+    # Difference array: +1 where an event starts, -1 where it ends, so the running sum counts shown events
+    steps = np.zeros(length + 1, dtype=np.int64)
+    np.add.at(steps, buckets[:, 0], 1)
+    np.add.at(steps, buckets[:, 1], -1)
+    signal = (np.cumsum(steps[:-1]) > 0).astype(np.float64)
+    return signal - signal.mean()
+
+
+def _best_lag(signal, reference_spectrum, size: int, lags) -> int:
+    """Lag (in samples) among ``lags`` by which ``signal`` best matches the reference."""
+    import numpy as np
+
+    # Circular cross-correlation; ``size`` is large enough that wrapped lags never collide
+    correlation = np.fft.irfft(reference_spectrum * np.conj(np.fft.rfft(signal, size)), size)
+    return int(lags[np.argmax(correlation[lags % size])])
+
+
+def estimate_shift(events: Sequence[Dialog], reference: Sequence[Dialog], resolution: int = 10,
+                   max_offset: int = 60000, drift: bool = False, segments: int = 8) -> TimeShift:
+    """Find the shift that best lines ``events`` up with ``reference`` by FFT cross-correlation of their
+    activity signals, searching offsets up to ``max_offset`` ms in both directions.
+
+    With ``drift``, the events are also cut into ``segments`` equal stretches of time, each stretch is
+    matched on its own near the global offset, and a line fitted through the per-stretch offsets gives
+    the drift.
+    """
+    import numpy as np
+
+    if not events or not reference:
+        return TimeShift()
+    end = max(max(event.end for event in events), max(event.end for event in reference))
+    length = end // resolution + 1
+    size = 1 << (2 * length - 1).bit_length()
+    max_lag = max_offset // resolution
+    ref_spectrum = np.fft.rfft(activity_signal(reference, resolution, length), size)
+
+    lags = np.arange(-max_lag, max_lag + 1)
+    offset = _best_lag(activity_signal(events, resolution, length), ref_spectrum, size, lags) * resolution
+    if not drift:
+        return TimeShift(offset)
+
+    # Local offsets only need to be searched around the global one
+    local_lags = offset // resolution + np.arange(-max_lag // 4, max_lag // 4 + 1)
+    starts = np.array([event.start for event in events])
+    bounds = np.linspace(starts.min(), starts.max() + 1, segments + 1)
+    centers, offsets = [], []
+    for low, high in zip(bounds[:-1], bounds[1:]):
+        chunk = [event for event, start in zip(events, starts) if low <= start < high]
+        if len(chunk) < 2:
+            continue
+        centers.append((low + high) / 2)
+        offsets.append(_best_lag(activity_signal(chunk, resolution, length), ref_spectrum, size, local_lags)
+                       * resolution)
+    if len(centers) < 2:
+        return TimeShift(offset)
+
+    slope, intercept = np.polyfit(centers, offsets, 1)
+    return TimeShift(int(round(intercept)), float(slope))
+
+
+def retime(doc: Subtitle, reference: Subtitle, resolution: int = 10, max_offset: int = 60000,
+           drift: bool = False) -> TimeShift:
+    """Shift ``doc`` in place to line up with ``reference``. Returns the applied shift."""
+    shift = estimate_shift(doc.events, reference.events, resolution, max_offset, drift)
+    shift.apply(doc.events)
+    logger.info(f"Retimed by {shift.offset} ms" + (f" with a drift of {shift.drift * 1e6:.0f} ppm"
+                                                   if shift.drift else ""))
+    return shift
@@ -0,0 +1,109 @@
+import logging
+import sqlite3
+import time
+from collections.abc import Iterable
+from pathlib import Path
+
+from .subtitle import Subtitle
+
+__all__ = (
+    "SQLiteSink",
+    "event_rows",
+)
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS files ("
+    "id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE, loaded_at REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS events ("
+    "file_id INTEGER NOT NULL REFERENCES files(id), idx INTEGER NOT NULL, start_ms INTEGER NOT NULL, "
+    "end_ms INTEGER NOT NULL, speaker TEXT NOT NULL, text TEXT NOT NULL)",
+)
+# Created once the bulk load is done; maintaining them row by row would slow the load down
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS events_file ON events (file_id, idx)",
+    "CREATE INDEX IF NOT EXISTS events_start ON events (start_ms)",
+)
+INSERT_EVENT = "INSERT INTO events (file_id, idx, start_ms, end_ms, speaker, text) VALUES (?, ?, ?, ?, ?, ?)"
+
+# (index, start, end, speaker, text)
+EventRow = tuple[int, int, int, str, str]
+
+
+def event_rows(doc: Subtitle) -> list[EventRow]:
+    """Plain tuples of the events of ``doc``, cheap to send between processes."""
+    return [(index, int(event.start), int(event.end), event.name, event.text)
+            for index, event in enumerate(doc.events)]
+
+
+class SQLiteSink:
+    """Loads processed events into a SQLite database.
+
+    Rows are buffered and inserted ``batch_size`` at a time with ``executemany``, each batch in one
+    transaction on a WAL-mode database. Indexes are created when the sink is closed. Loading a file
+    that is already in the database replaces its events.
+    """
+
+    def __init__(self, path: Path | str, batch_size: int = 50000):
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        for statement in SCHEMA:
+            self._conn.execute(statement)
+        self._pending: list[tuple] = []
+        self.files = 0
+        self.events = 0
+        self._conn.execute("BEGIN")
+
+    def add(self, source: Path | str, doc: Subtitle) -> None:
+        self.add_rows(source, event_rows(doc))
+
+    def add_rows(self, source: Path | str, rows: Iterable[EventRow]) -> None:
+        """Record the events of one processed file, identified by ``source``."""
+        source = str(source)
+        found = self._conn.execute("SELECT id FROM files WHERE path = ?", (source,)).fetchone()
+        if found is None:
+            file_id = self._conn.execute("INSERT INTO files (path, loaded_at) VALUES (?, ?)",
+                                         (source, time.time())).lastrowid
+        else:
+            file_id = found[0]
+            self._flush()
+            self._conn.execute("DELETE FROM events WHERE file_id = ?", (file_id,))
+            self._conn.execute("UPDATE files SET loaded_at = ? WHERE id = ?", (time.time(), file_id))
+        self._pending.extend((file_id, *row) for row in rows)
+        self.files += 1
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+            self._conn.execute("COMMIT")
+            self._conn.execute("BEGIN")
+
+    def _flush(self) -> None:
+        if self._pending:
+            self._conn.executemany(INSERT_EVENT, self._pending)
+            self.events += len(self._pending)
+            self._pending.clear()
+
+    def close(self) -> None:
+        if self._conn is None:
+            return
+        try:
+            self._flush()
+            self._conn.execute("COMMIT")
+            start = time.perf_counter()
+            for statement in INDEXES:
+                self._conn.execute(statement)
+            self._conn.execute("PRAGMA optimize")
+            logger.info(f"Indexed {self.path} in {time.perf_counter() - start:.2f}s")
+        finally:
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self) -> "SQLiteSink":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
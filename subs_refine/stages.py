@@ -0,0 +1,288 @@
+import importlib
+import inspect
+import logging
+import re
+from abc import ABC, abstractmethod
+from collections.abc import Iterable
+
+from .config import DEFAULT_TYPE_STAGES, ProcessingConfig
+from .constants import EMPTY_TEXTS
+from .regex_rules import RegexRuleSet, StaticRegexRules
+from .subtitle import Events, Subtitle
+from .text_processing import adjust_repeated_syllables, cjk_spacing, filter_interjections, fix_western_text
+
+__all__ = (
+    "Stage",
+    "CompiledStages",
+    "DocumentPasses",
+    "compile_passes",
+    "compile_stages",
+    "get_stage",
+    "register_stage",
+)
+
+logger = logging.getLogger(__name__)
+
+STAGES: dict[str, type["Stage"]] = {}
+
+SPACES_PATTERN = re.compile("\u3000+")
+
+
+class Stage(ABC):
+    """A processing step, listed by name in ``stages`` or ``type_stages`` of the config.
+
+    :meth:`compile` runs once per processor with its configuration. Text stages get one line of text at
+    a time from :meth:`apply` and return the new text, or None to drop the line. Document stages
+    (``document = True``, implied by ``stateless = False``) get the whole document instead and modify
+    it in place.
+
+    ``stateless`` stages only look at one line or event at a time; order-dependent ones relate events
+    to each other. In ``stages``, which run after the type-specific passes, the stateless text stages
+    are run back to back on each line and memoized by the text cache, so they must not depend on
+    anything but the text and the configuration; document stages follow them. ``type_stages`` are run
+    in the listed order. There, an order-dependent stage has to say whether it only relates events that
+    :func:`~.processor.split_blocks` keeps together (``local = True``, e.g. merging lines with the same
+    timing); incremental processing runs every stage up to the last non-local one on the whole document.
+
+    Any stage may be applied to several documents at once by the thread backend, so state must not
+    outlive a call.
+    """
+    name: str = ""
+    stateless: bool = True
+    document: bool = False
+    local: bool = False
+
+    def __init__(self):
+        self.active = True  # Set to False by compile() when the configuration turns the stage off
+
+    @property
+    def takes_document(self) -> bool:
+        return self.document or not self.stateless
+
+    def compile(self, config: ProcessingConfig) -> None:
+        pass
+
+    @abstractmethod
+    def apply(self, item):
+        ...
+
+
+def register_stage(cls: type[Stage]) -> type[Stage]:
+    """Class decorator making a stage available under its ``name``."""
+    if not cls.name:
+        raise ValueError(f"Stage {cls.__qualname__} has no name")
+    _check_concrete(cls)
+    STAGES[cls.name] = cls
+    return cls
+
+
+def _check_concrete(cls: type[Stage]) -> None:
+    if inspect.isabstract(cls):
+        missing = ", ".join(sorted(cls.__abstractmethods__))
+        raise ValueError(f"Stage {cls.__qualname__} does not implement {missing}")
+
+
+def get_stage(name: str) -> type[Stage]:
+    """Registered stage ``name``, or a stage class given as ``package.module:Class``."""
+    if name in STAGES:
+        return STAGES[name]
+    if ":" in name:
+        module_name, _, attribute = name.partition(":")
+        try:
+            cls = getattr(importlib.import_module(module_name), attribute)
+        except (ImportError, AttributeError) as e:
+            raise ValueError(f"Cannot load stage {name}: {e}")
+        if not (isinstance(cls, type) and issubclass(cls, Stage)):
+            raise ValueError(f"{name} is not a Stage")
+        _check_concrete(cls)
+        return cls
+    raise ValueError(f"Unknown stage {name}, expected one of {', '.join(STAGES)} or module:Class")
+
+
+class CompiledStages:
+    """Active stages of a configuration, split into the per-line and the whole-document ones."""
+
+    def __init__(self, stages: Iterable[Stage]):
+        stages = list(stages)
+        self.regex_rules = next((stage.rules for stage in stages if isinstance(stage, RegexMapping)), None)
+        stages = [stage for stage in stages if stage.active]
+        self.names = tuple(stage.name for stage in stages)
+        self.text = tuple(stage.apply for stage in stages if not stage.takes_document)
+        self.document = tuple(stage.apply for stage in stages if stage.takes_document)
+
+    def apply_text(self, text: str) -> str | None:
+        for apply in self.text:
+            text = apply(text)
+            if text is None:
+                return None
+        return text
+
+    def apply_document(self, doc: Subtitle) -> None:
+        for apply in self.document:
+            apply(doc)
+
+
+def _per_event(apply):
+    """Document pass running the text stage ``apply`` on every event."""
+    def run(doc: Subtitle) -> None:
+        kept = Events()
+        for event in doc.events:
+            text = apply(event.text)
+            if text is not None:
+                event.text = text
+                kept.append(event)
+        doc.events = kept
+    return run
+
+
+class DocumentPasses:
+    """Active stages of one subtitle type's ``type_stages``, run in order over the whole document.
+
+    Text stages listed there are applied to every event. :meth:`prepare` runs the stages up to the last
+    order-dependent one that is not ``local``, :meth:`finish` the rest; see :class:`Stage`.
+    """
+
+    def __init__(self, stages: Iterable[Stage]):
+        stages = [stage for stage in stages if stage.active]
+        self.names = tuple(stage.name for stage in stages)
+        self.passes = tuple(stage.apply if stage.takes_document else _per_event(stage.apply) for stage in stages)
+        self.split = max((index + 1 for index, stage in enumerate(stages) if not (stage.stateless or stage.local)),
+                         default=0)
+
+    def prepare(self, doc: Subtitle) -> None:
+        for apply in self.passes[:self.split]:
+            apply(doc)
+
+    def finish(self, doc: Subtitle) -> None:
+        for apply in self.passes[self.split:]:
+            apply(doc)
+
+    def __call__(self, doc: Subtitle) -> None:
+        self.prepare(doc)
+        self.finish(doc)
+
+
+def _instantiate(config: ProcessingConfig, names: Iterable[str], static: bool) -> list[Stage]:
+    stages = []
+    for name in names:
+        cls = get_stage(name)
+        if static and cls is RegexMapping:
+            cls = StaticRegexMapping
+        stage = cls()
+        stage.compile(config)
+        stages.append(stage)
+    return stages
+
+
+def compile_stages(config: ProcessingConfig, static: bool = False) -> CompiledStages:
+    """Instantiate and compile the stages listed in ``config``.
+
+    With ``static``, regex mappings run without time accounting so that threads can share them.
+    """
+    return CompiledStages(_instantiate(config, config.stages, static))
+
+
+def compile_passes(config: ProcessingConfig, type_: str, static: bool = False) -> DocumentPasses:
+    """Instantiate and compile the ``type_stages`` of subtitle type ``type_``, e.g. ``"tv_ass"``."""
+    names = config.type_stages.get(type_, DEFAULT_TYPE_STAGES[type_])
+    return DocumentPasses(_instantiate(config, names, static))
+
+
+@register_stage
+class CollapseSpaces(Stage):
+    name = "spaces"
+
+    def apply(self, text: str) -> str:
+        return SPACES_PATTERN.sub("\u3000", text).replace("⁉", "!?").replace("⁈", "?!").replace("‼", "!!")
+
+
+@register_stage
+class Interjections(Stage):
+    name = "interjections"
+
+    def compile(self, config: ProcessingConfig) -> None:
+        self.active = config.filter_interjections
+
+    def apply(self, text: str) -> str | None:
+        text = filter_interjections(text)
+        return None if text in EMPTY_TEXTS else text
+
+
+@register_stage
+class CJKSpacing(Stage):
+    name = "cjk_spacing"
+
+    def compile(self, config: ProcessingConfig) -> None:
+        self.active = config.cjk_spacing.enabled
+        self.space_char = config.cjk_spacing.space_char
+
+    def apply(self, text: str) -> str:
+        return cjk_spacing(text, self.space_char)
+
+
+@register_stage
+class RepeatedSyllables(Stage):
+    name = "repeated_syllables"
+
+    def compile(self, config: ProcessingConfig) -> None:
+        self.active = config.repetition_adjustment.enabled
+        self.connector = config.repetition_adjustment.connector
+
+    def apply(self, text: str) -> str:
+        return adjust_repeated_syllables(text, self.connector)
+
+
+@register_stage
+class TextMapping(Stage):
+    name = "text_mapping"
+
+    def compile(self, config: ProcessingConfig) -> None:
+        self.mapping = tuple(config.mapping.text.items())
+        self.active = bool(self.mapping)
+
+    def apply(self, text: str) -> str:
+        for key, value in self.mapping:
+            text = text.replace(key, value)
+        return text
+
+
+@register_stage
+class RegexMapping(Stage):
+    name = "regex_mapping"
+    rule_set = RegexRuleSet
+
+    def compile(self, config: ProcessingConfig) -> None:
+        self.rules = self.rule_set(config.mapping)
+        self.active = bool(self.rules.rules)
+
+    def apply(self, text: str) -> str:
+        return self.rules.apply(text)
+
+
+class StaticRegexMapping(RegexMapping):
+    rule_set = StaticRegexRules
+
+
+@register_stage
+class WesternText(Stage):
+    name = "western_text"
+
+    def apply(self, text: str) -> str:
+        return fix_western_text(text)
+
+
+@register_stage
+class Deduplication(Stage):
+    name = "deduplication"
+    stateless = False
+
+    def compile(self, config: ProcessingConfig) -> None:
+        self.active = config.deduplication.enabled
+        self.window = config.deduplication.window
+        self.tolerance = config.deduplication.tolerance
+
+    def apply(self, doc: Subtitle) -> None:
+        from .processor import collapse_repeated_lines
+
+        removed = collapse_repeated_lines(doc, self.window, self.tolerance)
+        logger.info(f"Collapsed {removed} repeated lines")
@@ -1,3 +1,3 @@
 from .events import Dialog, Events
-from .subtitle import Subtitle, load, from_text
+from .subtitle import Subtitle, load, from_text, sniff_format, INPUT_SUFFIXES
 from .types import Timecode, Color
@@ -1,4 +1,6 @@
+import json
 import logging
+import struct
 from collections.abc import Sequence
 from dataclasses import dataclass
 
@@ -6,6 +8,20 @@ from .types import Timecode, Position, Color
 
 logger = logging.getLogger(__name__)
 
+BINARY_MAGIC = b"SRFB"
+BINARY_VERSION = 2
+# magic, version, res_x, res_y, event count
+BINARY_HEADER = struct.Struct("<4sBIII")
+# start, end (signed, retiming may move lines before zero), r, g, b, flags,
+# then byte lengths of text, name, style in the string blob
+BINARY_RECORD = struct.Struct("<iiBBBBIII")
+# pos.x, pos.y, stored after the records only for those with FLAG_HAS_POS, in the same order
+BINARY_POSITION = struct.Struct("<ii")
+FLAG_HAS_POS = 1
+FLAG_HAS_COLOR = 2
+# Style of lines tagged as recurring across files (opening/ending songs), written as ASS comments
+RECURRING_STYLE = "Recurring"
+
 
 @dataclass
 class Dialog:
@@ -18,9 +34,38 @@ class Dialog:
     color: Color | None = None
 
     def to_ass_string(self, actor: bool = False, ending_char: str = "") -> str:
-        return f"Dialogue: 0,{self.start},{self.end},Default,{self.name if actor else ''},0,0,0,," +\
+        kind = "Comment" if self.style == RECURRING_STYLE else "Dialogue"
+        return f"{kind}: 0,{self.start},{self.end},Default,{self.name if actor else ''},0,0,0,," +\
             self.text.replace('\n', '\\N') + ending_char
 
+    def to_dict(self, ending_char: str = "") -> dict:
+        data = {
+            "start": int(self.start),
+            "end": int(self.end),
+            "name": self.name,
+            "text": self.text + ending_char,
+            "style": self.style,
+        }
+        if self.pos is not None:
+            data["pos"] = [self.pos.x, self.pos.y]
+        if self.color is not None:
+            data["color"] = self.color.to_ass_string()
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Dialog":
+        pos = data.get("pos")
+        color = data.get("color")
+        return cls(
+            start=Timecode(data["start"]),
+            end=Timecode(data["end"]),
+            text=data["text"],
+            style=data.get("style", "Default"),
+            name=data.get("name", ""),
+            pos=Position(*pos) if pos is not None else None,
+            color=Color.parse(color) if color is not None else None,
+        )
+
 
 class Events(list[Dialog]):
     def pop(self, index: int | Sequence[int] = -1) -> None:
@@ -47,3 +92,60 @@ class Events(list[Dialog]):
                 )
             )
         return "\n".join(result)
+
+    def to_jsonl_string(self, ending_char: str = "") -> str:
+        return "".join(json.dumps(line.to_dict(ending_char), ensure_ascii=False) + "\n" for line in self)
+
+    @classmethod
+    def from_jsonl_string(cls, text: str) -> "Events":
+        return cls(Dialog.from_dict(json.loads(line)) for line in text.splitlines() if line.strip())
+
+    def to_binary(self, res_x: int = 0, res_y: int = 0, ending_char: str = "") -> bytes:
+        records = []
+        positions = []
+        strings = []
+        for line in self:
+            text = (line.text + ending_char).encode("utf-8")
+            name = line.name.encode("utf-8")
+            style = line.style.encode("utf-8")
+            color = line.color or Color(0, 0, 0)
+            flags = (FLAG_HAS_POS if line.pos is not None else 0) | (FLAG_HAS_COLOR if line.color is not None else 0)
+            records.append(BINARY_RECORD.pack(line.start, line.end, color.r, color.g, color.b, flags,
+                                              len(text), len(name), len(style)))
+            if line.pos is not None:
+                positions.append(BINARY_POSITION.pack(line.pos.x, line.pos.y))
+            strings.extend((text, name, style))
+        header = BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, res_x, res_y, len(self))
+        return b"".join((header, *records, *positions, *strings))
+
+    @classmethod
+    def from_binary(cls, data: bytes) -> tuple["Events", int, int]:
+        """Load events written by :meth:`to_binary`. Returns ``(events, res_x, res_y)``."""
+        magic, version, res_x, res_y, count = BINARY_HEADER.unpack_from(data)
+        if magic != BINARY_MAGIC:
+            raise ValueError("Not a SubsRefine binary event file")
+        if version != BINARY_VERSION:
+            raise ValueError(f"Unsupported binary event format version: {version}")
+
+        records_end = BINARY_HEADER.size + count * BINARY_RECORD.size
+        records = list(BINARY_RECORD.iter_unpack(data[BINARY_HEADER.size:records_end]))
+        positions_end = records_end + sum(record[5] & FLAG_HAS_POS for record in records) * BINARY_POSITION.size
+        positions = BINARY_POSITION.iter_unpack(data[records_end:positions_end])
+        blob = memoryview(data)[positions_end:]
+        offset = 0
+
+        def take(length: int) -> str:
+            nonlocal offset
+            value = str(blob[offset:offset + length], "utf-8")
+            offset += length
+            return value
+
+        events = cls()
+        for start, end, r, g, b, flags, text_len, name_len, style_len in records:
+            text, name, style = take(text_len), take(name_len), take(style_len)
+            events.append(Dialog(
+                Timecode(start), Timecode(end), text, style, name,
+                Position(*next(positions)) if flags & FLAG_HAS_POS else None,
+                Color(r, g, b) if flags & FLAG_HAS_COLOR else None,
+            ))
+        return events, res_x, res_y
@@ -2,21 +2,47 @@ import logging
 import re
 from pathlib import Path
 
-from .events import Dialog, Events
+from .events import Dialog, Events, BINARY_MAGIC
 from .types import Timecode, Position, Color
+from ..compression import decompress, open_compressed, sniff_compression, split_compression
 from ..config import OutputSettings
 from ..constants import ASS_HEADER
+from ..fileio import atomic_open, atomic_write_bytes
 
 __all__ = (
     "Subtitle",
     "load",
     "from_text",
+    "INPUT_SUFFIXES",
+    "sniff_format",
 )
 
 logger = logging.getLogger(__name__)
 
 OVERRIDE_BLOCK_PATTERN = re.compile(r"(?<!\\){([^}]*)}")
 
+INPUT_SUFFIXES = (".ass", ".srt", ".vtt", ".jsonl", ".bin")
+
+ASS_SIGNATURE_PATTERN = re.compile(r"^\[Script Info]|^Dialogue:", re.MULTILINE)
+
+
+def sniff_format(text: str) -> str:
+    """Guess the file suffix of subtitle text. Falls back to ``.ass``."""
+    text = text.lstrip("\ufeff \t\n")
+    if text.startswith("WEBVTT"):
+        return ".vtt"
+    if text.startswith("{"):
+        return ".jsonl"
+    if ASS_SIGNATURE_PATTERN.search(text):
+        return ".ass"
+    if "-->" in text:
+        return ".srt"
+    return ".ass"
+
+
+def output_encoding(suffix: str) -> str:
+    return "utf-8-sig" if suffix == ".ass" else "utf-8"
+
 
 class Subtitle:
     def __init__(self):
@@ -25,25 +51,56 @@ class Subtitle:
         self.events = Events()
 
     @classmethod
-    def load(cls, path: Path | str, encoding: str = "utf-8") -> "Subtitle":
+    def load(cls, path: Path | str, encoding: str = "utf-8", start: int | None = None,
+             end: int | None = None) -> "Subtitle":
+        """Load a subtitle file, decompressing ``.gz``, ``.bz2`` and ``.xz`` files on the fly.
+
+        With ``start`` or ``end`` (in milliseconds), only the events shown in that range are loaded; for
+        uncompressed text files a sidecar time index is used so that only that part is parsed.
+        """
+        if start is not None or end is not None:
+            from .timeindex import load_range
+            return load_range(path, start, end, encoding)
         path = Path(path)
+        inner, compression = split_compression(path)
+        if inner.suffix not in INPUT_SUFFIXES:
+            raise ValueError(f"Format not supported: {path.suffix}")
+        if compression is None:
+            return cls.from_bytes(path.read_bytes(), inner.suffix, encoding)
+        with open_compressed(path, compression) as f:
+            return cls.from_bytes(f.read(), inner.suffix, encoding)
 
-        if path.suffix == ".ass":
-            return cls.from_ass_text(path.open("r", encoding=encoding).read())
+    @classmethod
+    def from_bytes(cls, data: bytes, suffix: str | None = None, encoding: str = "utf-8") -> "Subtitle":
+        """Parse raw file content, dispatching on a file suffix such as ``.ass``.
+
+        Without a suffix the format is sniffed from the content. Compressed content is recognized by
+        its magic bytes.
+        """
+        if compression := sniff_compression(data):
+            data = decompress(data, compression)
+        if suffix == ".bin" or suffix is None and data.startswith(BINARY_MAGIC):
+            return cls.from_binary(data)
+        return cls.from_text(data.decode(encoding).replace("\r\n", "\n").replace("\r", "\n"), suffix)
 
-        if path.suffix == ".srt":
-            return cls.from_srt_text(path.open("r", encoding=encoding).read())
+    @classmethod
+    def from_text(cls, text: str, suffix: str | None = None) -> "Subtitle":
+        if suffix is None:
+            suffix = sniff_format(text)
 
-        if path.suffix == ".vtt":
-            return cls.from_vtt_text(path.open("r", encoding=encoding).read())
+        if suffix == ".ass":
+            return cls.from_ass_text(text)
 
-        raise ValueError(f"Format not supported: {path.suffix}")
+        if suffix == ".srt":
+            return cls.from_srt_text(text)
 
-    @classmethod
-    def from_text(cls, text: str) -> "Subtitle":
-        if "-->" in text:
+        if suffix == ".vtt":
             return cls.from_vtt_text(text)
-        return cls.from_ass_text(text)
+
+        if suffix == ".jsonl":
+            return cls.from_jsonl_text(text)
+
+        raise ValueError(f"Format not supported: {suffix}")
 
     @classmethod
     def from_ass_text(cls, text: str) -> "Subtitle":
@@ -88,6 +145,18 @@ class Subtitle:
         return doc
 
 
+    @classmethod
+    def from_jsonl_text(cls, text: str) -> "Subtitle":
+        doc = cls()
+        doc.events = Events.from_jsonl_string(text)
+        return doc
+
+    @classmethod
+    def from_binary(cls, data: bytes) -> "Subtitle":
+        doc = cls()
+        doc.events, doc.res_x, doc.res_y = Events.from_binary(data)
+        return doc
+
     @classmethod
     def from_srt_text(cls, text: str) -> "Subtitle":
         return cls.from_vtt_text(text)
@@ -106,12 +175,26 @@ class Subtitle:
 
         return doc
 
+    def crop(self, start: int | None = None, end: int | None = None) -> None:
+        """Keep only the events shown at some point between ``start`` and ``end`` ms."""
+        if start is None and end is None:
+            return
+        start = start or 0
+        self.events = Events(event for event in self.events
+                             if event.end > start and (end is None or event.start < end))
+
     def to_ass(self, show_speaker: bool = False, ending_char: str = "") -> str:
         return ASS_HEADER + self.events.to_ass_string(show_speaker, ending_char)
 
     def to_srt(self, show_speaker: bool = False, ending_char: str = "") -> str:
         return self.events.to_srt_string(show_speaker, ending_char)
 
+    def to_jsonl(self, ending_char: str = "") -> str:
+        return self.events.to_jsonl_string(ending_char)
+
+    def to_binary(self, ending_char: str = "") -> bytes:
+        return self.events.to_binary(self.res_x, self.res_y, ending_char)
+
     def to_txt(self, show_speaker: bool = False, ending_char: str = "", show_pause_tip: int = 0) -> str:
         result = []
         last_end = 0
@@ -127,20 +210,39 @@ class Subtitle:
             )
         return "\n".join(result)
 
-    def save(self, path: Path | str, config: OutputSettings | None = None) -> None:
+    def dumps(self, suffix: str, config: OutputSettings | None = None) -> str:
         config = config or OutputSettings()
+        if suffix == ".ass":
+            return self.to_ass(config.show_speaker, config.ending)
+        if suffix == ".srt":
+            return self.to_srt(config.show_speaker, config.ending)
+        if suffix == ".txt":
+            return self.to_txt(config.show_speaker, config.ending, config.show_pause_tip)
+        if suffix == ".jsonl":
+            return self.to_jsonl(config.ending)
+        if suffix == ".bin":
+            raise ValueError("Binary format has no text form, use to_bytes()")
+        raise ValueError(f"Invalid format: {suffix}")
+
+    def to_bytes(self, suffix: str, config: OutputSettings | None = None) -> bytes:
+        if suffix == ".bin":
+            return self.to_binary((config or OutputSettings()).ending)
+        return self.dumps(suffix, config).encode(output_encoding(suffix))
+
+    def save(self, path: Path | str, config: OutputSettings | None = None) -> None:
+        """Write atomically in the format of the suffix, compressing for ``.gz``, ``.bz2`` and ``.xz``."""
         path = Path(path)
-        if path.suffix == ".ass":
-            text = self.to_ass(config.show_speaker, config.ending)
-        elif path.suffix == ".srt":
-            text = self.to_srt(config.show_speaker, config.ending)
-        elif path.suffix == ".txt":
-            text = self.to_txt(config.show_speaker, config.ending, config.show_pause_tip)
-        else:
-            raise ValueError(f"Invalid format: {path.suffix}")
-
-        encoding = "utf-8-sig" if path.suffix == ".ass" else "utf-8"
-        with open(path, "w", encoding=encoding) as f:
+        inner, compression = split_compression(path)
+        if compression is not None:
+            data = self.to_bytes(inner.suffix, config)
+            with atomic_open(path, "wb") as f, open_compressed(f, compression, "wb") as stream:
+                stream.write(data)
+            return
+        if path.suffix == ".bin":
+            atomic_write_bytes(path, self.to_bytes(path.suffix, config))
+            return
+        text = self.dumps(path.suffix, config)
+        with atomic_open(path, "w", encoding=output_encoding(path.suffix)) as f:
             f.write(text)
 
     def __repr__(self) -> str:
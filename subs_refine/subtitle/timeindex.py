@@ -0,0 +1,166 @@
+import json
+import logging
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .subtitle import Subtitle
+from .types import Timecode
+from ..fileio import atomic_write_bytes
+
+__all__ = (
+    "INDEXED_SUFFIXES",
+    "TimeIndex",
+    "index_path",
+    "load_range",
+)
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+INDEXED_SUFFIXES = (".ass", ".srt", ".vtt")
+BUCKET_MS = 10000
+
+TIMING_PATTERN = re.compile(rb"((?:\d+:)?\d{2}:\d{2}[.,]\d{2,3}) +--> +((?:\d+:)?\d{2}:\d{2}[.,]\d{2,3})")
+RESOLUTION_PATTERN = re.compile(rb"Res([XY]): ?(\d+)")
+
+
+def index_path(path: Path | str) -> Path:
+    path = Path(path)
+    return path.with_name(f"{path.name}.timeindex.json")
+
+
+@dataclass
+class TimeIndex:
+    """Where the cues of an uncompressed ASS, SRT or VTT file lie, per ``bucket`` ms of time.
+
+    ``spans`` maps a bucket number to the first and the past-the-end byte offsets of the cues shown
+    during that bucket. Files whose cues are out of time order still work, with wider spans.
+    """
+    size: int
+    mtime_ns: int
+    bucket: int = BUCKET_MS
+    res_x: int = 960
+    res_y: int = 540
+    spans: dict[int, tuple[int, int]] = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, path: Path | str, bucket: int = BUCKET_MS) -> "TimeIndex":
+        """Scan the lines of ``path`` for cue timings without parsing the cues."""
+        path = Path(path)
+        stat = path.stat()
+        index = cls(stat.st_size, stat.st_mtime_ns, bucket)
+        ass = path.suffix == ".ass"
+        offset = 0
+        pending = None  # SRT/VTT cue whose end is only known at the next timing line: (offset, start, end)
+        previous_start, previous_blank = 0, True
+        with open(path, "rb") as f:
+            for line in f:
+                if ass:
+                    if line.startswith(b"Dialogue:"):
+                        try:
+                            fields = line.split(b",", 9)
+                            start, end = Timecode(fields[1].strip().decode()), Timecode(fields[2].strip().decode())
+                        except (IndexError, ValueError):
+                            pass
+                        else:
+                            index._add(start, end, offset, offset + len(line))
+                    elif match := RESOLUTION_PATTERN.search(line):
+                        setattr(index, f"res_{match.group(1).decode().lower()}", int(match.group(2)))
+                elif b"-->" in line and (match := TIMING_PATTERN.search(line)):
+                    try:
+                        start, end = Timecode(match.group(1).decode()), Timecode(match.group(2).decode())
+                    except ValueError:
+                        pass
+                    else:
+                        # A cue ends where the number or identifier line of the next one begins
+                        if pending is not None:
+                            index._add(*pending[1:], pending[0], offset if previous_blank else previous_start)
+                        pending = (offset, start, end)
+                previous_start, previous_blank = offset, not line.strip()
+                offset += len(line)
+        if pending is not None:
+            index._add(*pending[1:], pending[0], offset)
+        return index
+
+    def _add(self, start: int, end: int, first: int, last: int) -> None:
+        for bucket in range(start // self.bucket, max(start, end) // self.bucket + 1):
+            low, high = self.spans.get(bucket, (first, last))
+            self.spans[bucket] = (min(low, first), max(high, last))
+
+    def span(self, start: int = 0, end: int | None = None) -> tuple[int, int] | None:
+        """Byte range holding every cue shown between ``start`` and ``end`` ms, or None if there is none."""
+        first_bucket = start // self.bucket
+        last_bucket = None if end is None else max(end - 1, start) // self.bucket
+        spans = [span for bucket, span in self.spans.items()
+                 if bucket >= first_bucket and (last_bucket is None or bucket <= last_bucket)]
+        if not spans:
+            return None
+        return min(low for low, _ in spans), max(high for _, high in spans)
+
+    def matches(self, path: Path | str) -> bool:
+        """Whether ``path`` is still the file this index was built from."""
+        stat = Path(path).stat()
+        return stat.st_size == self.size and stat.st_mtime_ns == self.mtime_ns
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "version": INDEX_VERSION, "size": self.size, "mtime_ns": self.mtime_ns, "bucket": self.bucket,
+            "res_x": self.res_x, "res_y": self.res_y,
+            "spans": [[bucket, low, high] for bucket, (low, high) in sorted(self.spans.items())],
+        })
+
+    @classmethod
+    def from_json(cls, text: str) -> "TimeIndex":
+        data = json.loads(text)
+        if data.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported time index version {data.get('version')}")
+        return cls(data["size"], data["mtime_ns"], data["bucket"], data["res_x"], data["res_y"],
+                   {bucket: (low, high) for bucket, low, high in data["spans"]})
+
+    @classmethod
+    def open(cls, path: Path | str) -> "TimeIndex":
+        """The sidecar index of ``path``, built and written next to it when missing or out of date."""
+        path = Path(path)
+        sidecar = index_path(path)
+        try:
+            index = cls.from_json(sidecar.read_text(encoding="utf-8"))
+            if index.matches(path):
+                return index
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable time index {sidecar}: {e}")
+        index = cls.build(path)
+        try:
+            atomic_write_bytes(sidecar, index.to_json().encode("utf-8"))
+            logger.info(f"Wrote time index {sidecar}")
+        except OSError as e:
+            logger.warning(f"Could not write time index {sidecar}: {e}")
+        return index
+
+
+def load_range(path: Path | str, start: int | None = None, end: int | None = None,
+               encoding: str = "utf-8") -> Subtitle:
+    """Load the events of ``path`` shown between ``start`` and ``end`` ms.
+
+    Uncompressed ASS, SRT and VTT files are read through their :class:`TimeIndex`, so only the byte
+    range holding those events is parsed. Other files are parsed whole and then cropped.
+    """
+    path = Path(path)
+    start = start or 0
+    if path.suffix not in INDEXED_SUFFIXES:
+        doc = Subtitle.load(path, encoding)
+    else:
+        index = TimeIndex.open(path)
+        span = index.span(start, end)
+        if span is None:
+            doc = Subtitle()
+        else:
+            low, high = span
+            with open(path, "rb") as f:
+                f.seek(low)
+                doc = Subtitle.from_bytes(f.read(high - low), path.suffix, encoding)
+        doc.res_x, doc.res_y = index.res_x, index.res_y
+    doc.crop(start, end)
+    return doc
@@ -0,0 +1,54 @@
+import random
+import time
+
+from subs_refine.align import IntervalIndex, align_events
+from subs_refine.subtitle import Dialog, Timecode
+
+
+def make_events(spans):
+    return [Dialog(Timecode(start), Timecode(end), f"{start}-{end}") for start, end in spans]
+
+
+def brute_force_join(primary, secondary):
+    pairs = set()
+    for i, p in enumerate(primary):
+        for j, s in enumerate(secondary):
+            overlap = min(p.end, s.end) - max(p.start, s.start)
+            if overlap > 0:
+                pairs.add((i, j, overlap))
+    return pairs
+
+
+def test_join_matches_brute_force():
+    rng = random.Random(39)
+    for _ in range(50):
+        spans = []
+        for _ in range(2):
+            starts = [rng.randrange(0, 20000) for _ in range(rng.randrange(0, 60))]
+            spans.append([(start, start + rng.choice((0, 1, 500, 3000, 20000))) for start in starts])
+        primary, secondary = make_events(spans[0]), make_events(spans[1])
+        joined = list(IntervalIndex(primary).join(IntervalIndex(secondary)))
+        assert len(joined) == len(set(joined))
+        assert set(joined) == brute_force_join(primary, secondary)
+
+
+def test_align_prefers_largest_then_earliest_overlap():
+    primary = make_events([(0, 1000), (1000, 2000), (500, 1500)])
+    secondary = make_events([(900, 1600), (400, 600), (1000, 1200)])
+    assert align_events(primary, secondary) == [[1], [], [0, 2]]
+
+
+def test_join_with_long_event_is_not_quadratic():
+    # One event spanning the whole track used to keep every later interval in the live set
+    n = 50_000
+    primary = make_events([(0, n * 1000)] + [(i * 1000, i * 1000 + 900) for i in range(n)])
+    secondary = make_events([(i * 1000 + 100, i * 1000 + 800) for i in range(n)])
+    # The join compares an interval only with live intervals of the other side and every comparison yields a
+    # pair, so the pair count bounds the work: each secondary meets the long event and its own line
+    assert sum(1 for _ in IntervalIndex(primary).join(IntervalIndex(secondary))) == 2 * n
+    start = time.perf_counter()
+    matches = align_events(primary, secondary)
+    elapsed = time.perf_counter() - start
+    # Each secondary overlaps the long event as much as its own line, and ties go to the earlier event
+    assert matches[0] == list(range(n))
+    assert elapsed < 1, f"align took {elapsed:.2f}s"
@@ -0,0 +1,19 @@
+import zipfile
+
+import pytest
+
+from subs_refine.archive import ArchiveWriter
+
+
+def test_failed_write_keeps_previous_archive(tmp_path):
+    path = tmp_path / "out.zip"
+    with ArchiveWriter(path) as writer:
+        writer.write("good.txt", b"good")
+
+    with pytest.raises(KeyboardInterrupt):
+        with ArchiveWriter(path) as writer:
+            writer.write("partial.txt", b"partial")
+            raise KeyboardInterrupt
+
+    assert zipfile.ZipFile(path).namelist() == ["good.txt"]
+    assert [p.name for p in tmp_path.iterdir()] == ["out.zip"]
@@ -0,0 +1,78 @@
+import gzip
+import lzma
+import tracemalloc
+from pathlib import Path
+
+from subs_refine import ProcessingConfig, Processor, batch
+from subs_refine.batch import FileCost, _Admission, count_events, estimate_cost, process_file
+
+SRT = "".join(f"{i + 1}\n00:00:0{i},000 --> 00:00:0{i},900\nline {i}\n\n" for i in range(9)).encode()
+
+
+def test_count_events_across_chunks_and_compression(tmp_path, monkeypatch):
+    plain = tmp_path / "ep01.srt"
+    plain.write_bytes(SRT)
+    compressed = tmp_path / "ep02.srt.gz"
+    compressed.write_bytes(gzip.compress(SRT))
+    unknown = tmp_path / "notes.txt.gz"
+    unknown.write_bytes(gzip.compress(SRT))
+
+    # Chunks shorter than the marker split most markers across two reads
+    for chunk_size in (2, 7, 1 << 20):
+        monkeypatch.setattr(batch, "COUNT_CHUNK_SIZE", chunk_size)
+        assert count_events(plain) == 9
+        assert count_events(compressed) == 9
+        assert count_events(unknown) == 0
+
+
+def test_compressed_estimate_is_extrapolated_without_decompressing(tmp_path, monkeypatch):
+    data = SRT * 50
+    plain = tmp_path / "ep01.srt"
+    plain.write_bytes(data)
+    compressed = tmp_path / "ep01.srt.xz"
+    compressed.write_bytes(lzma.compress(data))
+
+    plain_cost = estimate_cost(plain)
+    assert plain_cost.raw_size == plain_cost.size == len(data)
+    assert plain_cost.events == 450
+    assert plain_cost.memory == len(data) * batch.MEMORY_PER_INPUT_BYTE
+
+    def no_decompression(*args, **kwargs):
+        raise AssertionError("compressed input decompressed before dispatch")
+
+    monkeypatch.setattr(batch, "open_compressed", no_decompression)
+    compressed_cost = estimate_cost(compressed)
+    assert compressed_cost.size == len(lzma.compress(data))
+    assert compressed_cost.raw_size == compressed_cost.size * batch.COMPRESSION_RATIOS[".xz"]
+    assert compressed_cost.events == compressed_cost.raw_size // batch.BYTES_PER_EVENT[".srt"]
+    assert compressed_cost.memory == compressed_cost.raw_size * batch.MEMORY_PER_INPUT_BYTE
+
+
+def test_memory_tracking_stops_tracing_after_the_file(tmp_path):
+    path = tmp_path / "ep01.srt"
+    path.write_bytes(SRT)
+    assert not tracemalloc.is_tracing()
+    result = process_file(Processor(ProcessingConfig()), path, collect=True, track_memory=True)
+    assert result.error is None
+    assert result.memory.events_in == 9 and result.memory.peak > 0
+    assert result.memory.raw_bytes == len(SRT)
+    assert not tracemalloc.is_tracing()
+
+
+def test_smaller_files_go_ahead_of_one_that_does_not_fit(monkeypatch):
+    def cost(memory, predicted):
+        return FileCost(predicted=predicted, raw_size=memory // batch.MEMORY_PER_INPUT_BYTE)
+
+    monkeypatch.setattr(batch, "HEAD_SKIP_LIMIT", 2)
+    files = [(Path("a"), cost(600, 9)), (Path("b"), cost(600, 8))] + \
+        [(Path(f"c{i}"), cost(100, 5 - i)) for i in range(4)]
+    admission = _Admission(files, max_inflight_bytes=1000)
+    assert admission.take()[0] == Path("a")
+    # b does not fit next to a, so smaller files go first, but only twice
+    assert admission.take()[0] == Path("c0")
+    assert admission.take()[0] == Path("c1")
+    assert admission.take() is None
+    admission.release(files[0][1])
+    assert admission.take()[0] == Path("b")
+    assert [admission.take()[0] for _ in range(2)] == [Path("c2"), Path("c3")]
+    assert not admission
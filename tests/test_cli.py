@@ -0,0 +1,39 @@
+import zipfile
+from pathlib import Path
+
+from cli import process_archive, skip_output_collisions
+from subs_refine import ProcessingConfig, Processor
+from subs_refine.config import OutputSettings
+from subs_refine.incremental import sidecar_path
+
+SRT = "1\n00:00:01,000 --> 00:00:02,000\nこんにちは\n\n"
+
+
+def test_compressed_twin_is_skipped(capsys):
+    files = [Path("a/ep01.srt"), Path("a/ep01.srt.gz"), Path("a/ep02.srt.gz"), Path("b/ep01.srt"), Path("a/show.zip")]
+    processor = Processor(ProcessingConfig())
+
+    assert skip_output_collisions(processor, files) == [
+        Path("a/ep01.srt"), Path("a/ep02.srt.gz"), Path("b/ep01.srt"), Path("a/show.zip")]
+    assert "Skipping a/ep01.srt.gz" in capsys.readouterr().out
+
+    # Outputs in one directory or archive collide across input directories too
+    assert skip_output_collisions(processor, files, archive=True) == [
+        Path("a/ep01.srt"), Path("a/ep02.srt.gz"), Path("a/show.zip")]
+    processor.config.output.dir = Path("out")
+    assert skip_output_collisions(processor, files) == [Path("a/ep01.srt"), Path("a/ep02.srt.gz"), Path("a/show.zip")]
+
+
+def test_archive_members_get_tracks_and_incremental_sidecars(tmp_path, capsys):
+    archive = tmp_path / "show.zip"
+    with zipfile.ZipFile(archive, "w") as f:
+        f.writestr("disc1/ep01.srt", SRT)
+    # Tracks of members are looked up as if the archive was extracted next to it
+    (tmp_path / "show" / "disc1").mkdir(parents=True)
+    (tmp_path / "show" / "disc1" / "ep01.en.srt").write_text(SRT.replace("こんにちは", "Hello"), encoding="utf-8")
+    config = ProcessingConfig(output=OutputSettings(align_with="{dir}/{stem}.en.srt"), incremental=True)
+
+    process_archive(Processor(config), archive)
+    output = tmp_path / "show" / "disc1" / "ep01_processed.txt"
+    assert "Hello" in output.read_text(encoding="utf-8")
+    assert sidecar_path(output).is_file()
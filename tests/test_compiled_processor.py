@@ -0,0 +1,87 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from subs_refine import ProcessingConfig, Processor
+from subs_refine.config import OutputFormat, OutputSettings
+from subs_refine.processor import CompiledProcessor
+
+ASS_HEADER = ("[Script Info]\nPlayResX: 1920\nPlayResY: 1080\n\n[Events]\n"
+              "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n")
+ASS_LINES = ("{\\c&H00ffff&}お父さんがいっぱいだー！", "{\\c&Hffff00&}意味が分からない", "（清子）まあまあ",
+             "今は楽しい歓迎会の場です", "ｼｬｯﾌﾙｸｲｽﾞしたら面白そうです", "えっ", "≫はい　ええ", "ＡＢＣ　１２３です")
+SRT_LINES = ("♪～", "（太郎）おはよう！　元気？", "≫はい　ええ", "ＡＢＣ　１２３です", "あ… ありがとう", "(拍手)　すごい！本当に")
+
+
+def timestamp(ms: int, separator: str) -> str:
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d}{separator}{ms % 1000:03d}"
+
+
+def make_inputs(count: int) -> list[tuple[str, str]]:
+    """Different documents of every subtitle type: (text, format)."""
+    rng = random.Random(44)
+    inputs = []
+    for n in range(count):
+        lines = [(i * 2000, rng.choice(ASS_LINES if n % 2 == 0 else SRT_LINES)) for i in range(rng.randrange(20, 80))]
+        if n % 2 == 0:
+            text = ASS_HEADER + "".join(
+                f"Dialogue: 0,{timestamp(ms, '.')[1:-1]},{timestamp(ms + 1500, '.')[1:-1]},Default,,0,0,0,,"
+                f"{{\\pos({rng.choice((340, 620))},{rng.choice((898, 1018))})}}{line}\n" for ms, line in lines)
+            inputs.append((text, "ass"))
+        else:
+            text = "\n".join(f"{i + 1}\n{timestamp(ms, ',')} --> {timestamp(ms + 1500, ',')}\n{line}\n"
+                             for i, (ms, line) in enumerate(lines))
+            inputs.append((text, "srt"))
+    return inputs
+
+
+@pytest.fixture
+def config() -> ProcessingConfig:
+    config = ProcessingConfig(output=OutputSettings(format=OutputFormat.ASS, show_speaker=True))
+    config.mapping.regex["[ヶケ]月"] = "か月"
+    config.deduplication.enabled = True
+    return config
+
+
+def test_threads_sharing_one_compiled_processor_match_serial_run(config):
+    inputs = make_inputs(64) * 4
+    serial = [Processor(config).process_text(text, input_format) for text, input_format in inputs]
+
+    compiled = Processor(config).compile()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        threaded = list(pool.map(lambda item: compiled.process_text(*item), inputs))
+
+    assert threaded == serial
+
+
+def test_compiled_processor_is_immutable(config):
+    text, input_format = make_inputs(1)[0]
+    compiled = CompiledProcessor(config)
+    expected = compiled.process_text(text, input_format)
+
+    # Changes to the original configuration do not reach the compiled copy
+    config.filter_interjections = False
+    config.output.format = OutputFormat.TXT
+    config.mapping.regex["お父さん"] = "父"
+    config.stages.remove("spaces")
+    config.time_range.start = 60000
+    assert compiled.config.filter_interjections is True
+    assert compiled.process_text(text, input_format) == expected
+
+    # and the compiled copy cannot be changed at any depth
+    with pytest.raises(AttributeError):
+        compiled.config.output.format = OutputFormat.TXT
+    with pytest.raises(AttributeError):
+        compiled.config.time_range.start = 60000
+    with pytest.raises(TypeError):
+        compiled.config.mapping.regex["お父さん"] = "父"
+    with pytest.raises(AttributeError):
+        compiled.config.stages.remove("spaces")
+    assert compiled.process_text(text, input_format) == expected
+
+    with pytest.raises(AttributeError):
+        compiled.config = ProcessingConfig()
+    with pytest.raises(AttributeError):
+        compiled.set_config(ProcessingConfig())
+    assert compiled.compile() is compiled
@@ -0,0 +1,19 @@
+from subs_refine.subtitle import Dialog, Events, Timecode
+from subs_refine.subtitle.events import BINARY_HEADER, BINARY_POSITION, BINARY_RECORD
+from subs_refine.subtitle.types import Color, Position
+
+
+def test_binary_round_trip_keeps_negative_times_and_optional_fields():
+    events = Events([
+        Dialog(Timecode(-1500), Timecode(-200), "前", pos=Position(-10, 20)),
+        Dialog(Timecode(0), Timecode(1000), "中", name="A", color=Color(1, 2, 3)),
+        Dialog(Timecode(1000), Timecode(2500), "後", style="Sign", pos=Position(640, 360), color=Color(4, 5, 6)),
+    ])
+    loaded, res_x, res_y = Events.from_binary(events.to_binary(1920, 1080))
+    assert (res_x, res_y) == (1920, 1080)
+    assert list(loaded) == list(events)
+
+
+def test_binary_stores_positions_only_when_present():
+    events = Events([Dialog(Timecode(0), Timecode(1000), ""), Dialog(Timecode(0), Timecode(1000), "", pos=Position(1, 2))])
+    assert len(events.to_binary()) == BINARY_HEADER.size + 2 * BINARY_RECORD.size + BINARY_POSITION.size + 2 * len("Default")
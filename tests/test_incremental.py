@@ -0,0 +1,110 @@
+import json
+
+import pytest
+
+from subs_refine import ProcessingConfig, Processor, Subtitle
+from subs_refine.config import MergeStrategy, OutputFormat, OutputSettings
+from subs_refine.incremental import process_incrementally
+
+HEADER = ("[Script Info]\nPlayResX: 1920\nPlayResY: 1080\n\n[Events]\n"
+          "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n")
+# (offset, duration, position, color, text); lines sharing their timing are merged into one block
+CUE = (
+    (0, 3000, (340, 1018), "\\c&H00ffff&", "お父さんがいっぱいだー！"),
+    (3000, 3500, (620, 898), "\\c&Hffff00&", "意味が分からない"),
+    (3000, 3500, (620, 1018), "\\c&Hffff00&", "つまり えっと…"),
+    (6500, 3500, (620, 898), "", "(清子)まあまあ"),
+    (6500, 3500, (620, 1018), "", "今は楽しい歓迎会の場です"),
+    (10000, 3000, (940, 898), "", "あとで考えましょ"),
+    (10000, 3000, (340, 1018), "", "ｼｬｯﾌﾙｸｲｽﾞしたら面白そうです"),
+    (13000, 2000, (580, 1018), "", "当てる自信ありです"),
+)
+REPEATS = 10
+BLOCKS = 5 * REPEATS
+
+
+def timestamp(ms: int) -> str:
+    return f"{ms // 3600000}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d}.{ms % 1000 // 10:02d}"
+
+
+def make_ass(edit: int | None = None) -> str:
+    lines = []
+    for repeat in range(REPEATS):
+        for index, (offset, duration, (x, y), color, text) in enumerate(CUE):
+            start = repeat * 20000 + offset
+            if edit == repeat and index == 7:
+                text = "当てる自信はありません"
+            lines.append(f"Dialogue: 0,{timestamp(start)},{timestamp(start + duration)},Default,,0,0,0,,"
+                         f"{{\\pos({x},{y}){color}}}{text}\n")
+    return HEADER + "".join(lines)
+
+
+@pytest.fixture
+def config() -> ProcessingConfig:
+    return ProcessingConfig(output=OutputSettings(format=OutputFormat.ASS, show_speaker=True))
+
+
+def full_run(config: ProcessingConfig, text: str) -> bytes:
+    doc = Subtitle.from_text(text, ".ass")
+    Processor(config).process_subtitle(doc)
+    return doc.to_bytes(".ass", config.output)
+
+
+def incremental_run(config: ProcessingConfig, text: str, sidecar, monkeypatch) -> tuple[bytes, int]:
+    """Output of an incremental run and the number of blocks it processed."""
+    processor = Processor(config)
+    finished = []
+    finish = processor.finish
+    monkeypatch.setattr(processor, "finish", lambda doc, type_: finished.append(len(doc.events)) or finish(doc, type_))
+    doc = Subtitle.from_text(text, ".ass")
+    process_incrementally(processor, doc, sidecar)
+    return doc.to_bytes(".ass", config.output), len(finished)
+
+
+def test_unchanged_input_reuses_every_block(config, tmp_path, monkeypatch):
+    sidecar = tmp_path / "out.ass.incremental.json"
+    first, processed = incremental_run(config, make_ass(), sidecar, monkeypatch)
+    assert processed == BLOCKS
+    assert first == full_run(config, make_ass())
+
+    second, processed = incremental_run(config, make_ass(), sidecar, monkeypatch)
+    assert processed == 0
+    assert second == first
+
+
+def test_edited_block_is_the_only_one_reprocessed(config, tmp_path, monkeypatch):
+    sidecar = tmp_path / "out.ass.incremental.json"
+    incremental_run(config, make_ass(), sidecar, monkeypatch)
+
+    output, processed = incremental_run(config, make_ass(edit=4), sidecar, monkeypatch)
+    assert processed == 1
+    # Speakers are renumbered per block, so the spliced output matches a full run byte for byte
+    assert output == full_run(config, make_ass(edit=4))
+    assert "当てる自信はありません".encode() in output
+
+
+def test_config_change_invalidates_sidecar(config, tmp_path, monkeypatch):
+    sidecar = tmp_path / "out.ass.incremental.json"
+    incremental_run(config, make_ass(), sidecar, monkeypatch)
+
+    # Output settings do not change the processed events, so the sidecar stays valid
+    config.output.show_speaker = False
+    assert incremental_run(config, make_ass(), sidecar, monkeypatch)[1] == 0
+
+    config.merge_strategy = MergeStrategy.FORCE
+    output, processed = incremental_run(config, make_ass(), sidecar, monkeypatch)
+    assert processed == BLOCKS
+    assert output == full_run(config, make_ass())
+
+
+@pytest.mark.parametrize("content", [None, "{not json", "[]", json.dumps({"version": 0, "blocks": {}}),
+                                     json.dumps({"version": 1, "blocks": []})])
+def test_missing_or_corrupt_sidecar_falls_back_to_full_processing(config, tmp_path, monkeypatch, content):
+    sidecar = tmp_path / "out.ass.incremental.json"
+    if content is not None:
+        sidecar.write_text(content, encoding="utf-8")
+
+    output, processed = incremental_run(config, make_ass(), sidecar, monkeypatch)
+    assert processed == BLOCKS
+    assert output == full_run(config, make_ass())
+    assert incremental_run(config, make_ass(), sidecar, monkeypatch)[1] == 0
@@ -0,0 +1,108 @@
+import logging
+import sqlite3
+import time
+
+from subs_refine import ProcessingConfig, Processor
+from subs_refine import jobqueue
+from subs_refine.batch import FileResult
+from subs_refine.jobqueue import JobQueue, run_worker, run_workers
+
+SRT = "1\n00:00:01,000 --> 00:00:02,500\n（太郎）おはよう！　元気？\n\n2\n00:00:03,000 --> 00:00:04,000\n≫はい　ええ\n"
+
+
+def make_inputs(directory, count):
+    paths = []
+    for i in range(count):
+        path = directory / f"ep{i:02d}.srt"
+        path.write_text(SRT, encoding="utf-8")
+        paths.append(path)
+    return paths
+
+
+def test_run_workers_drains_queue_with_several_processes(tmp_path):
+    paths = make_inputs(tmp_path, 6)
+    queue_path = tmp_path / "queue.db"
+    with JobQueue(queue_path) as queue:
+        assert queue.enqueue(paths) == 6
+        assert queue.enqueue(paths) == 0
+
+    run_workers(queue_path, ProcessingConfig(), jobs=3, poll_interval=0.1)
+
+    with JobQueue(queue_path) as queue:
+        assert queue.counts() == {"pending": 0, "running": 0, "done": 6, "failed": 0}
+        outputs = queue._conn.execute("SELECT output FROM jobs").fetchall()
+    processor = Processor(ProcessingConfig())
+    for path in paths:
+        assert (path.parent / processor.output_filename(path)).exists()
+    assert all(output is not None for output, in outputs)
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    path, = make_inputs(tmp_path, 1)
+    with JobQueue(tmp_path / "queue.db", lease_seconds=0.1) as queue:
+        queue.enqueue([path])
+        first = queue.claim("a")
+        assert first.attempts == 1
+        assert queue.claim("b") is None  # Leased to a
+
+        time.sleep(0.2)
+        second = queue.claim("b")
+        assert (second.id, second.attempts, second.owner) == (first.id, 2, "b")
+        assert not queue.heartbeat(first)
+        assert queue.heartbeat(second)
+
+        # The former owner's late result does not overwrite the new owner's
+        queue.complete(first, "stale")
+        assert queue.counts()["running"] == 1
+        queue.complete(second, "fresh")
+        assert queue._conn.execute("SELECT state, output FROM jobs").fetchone() == ("done", "fresh")
+
+
+def test_job_fails_after_max_attempts(tmp_path):
+    good, = make_inputs(tmp_path, 1)
+    missing = tmp_path / "missing.srt"
+    with JobQueue(tmp_path / "queue.db", max_attempts=2) as queue:
+        queue.enqueue([good, missing])
+        assert run_worker(queue, Processor(ProcessingConfig()), owner="w", poll_interval=0) == 1
+        assert queue.counts() == {"pending": 0, "running": 0, "done": 1, "failed": 1}
+        (failed_path, error), = queue.failures()
+        assert failed_path == str(missing.resolve()) and error
+        assert queue._conn.execute("SELECT attempts FROM jobs WHERE path = ?", (failed_path,)).fetchone() == (2,)
+
+        queue.enqueue([], retry_failed=True)
+        assert queue.counts()["pending"] == 1
+
+
+def test_abandoned_last_attempt_is_failed(tmp_path):
+    path, = make_inputs(tmp_path, 1)
+    with JobQueue(tmp_path / "queue.db", lease_seconds=0.05, max_attempts=1) as queue:
+        queue.enqueue([path])
+        assert queue.claim("crashed") is not None
+        time.sleep(0.1)
+        assert queue.claim("next") is None
+        assert queue.failures() == [(str(path.resolve()), "Lease expired")]
+
+
+def test_lost_lease_is_reported_and_not_completed(tmp_path, monkeypatch, caplog):
+    path, = make_inputs(tmp_path, 1)
+    queue_path = tmp_path / "queue.db"
+    calls = []
+
+    def fake_process_file(processor, job_path):
+        calls.append(job_path)
+        if len(calls) == 1:
+            # Another worker takes the job over; its lease has already run out again by the time we poll
+            with sqlite3.connect(queue_path) as conn:
+                conn.execute("UPDATE jobs SET owner = 'other', lease_expires = 0")
+            time.sleep(0.2)
+        return FileResult(job_path, output=job_path.with_suffix(".out"))
+
+    monkeypatch.setattr(jobqueue, "process_file", fake_process_file)
+    with JobQueue(queue_path, lease_seconds=0.15) as queue, caplog.at_level(logging.INFO, "subs_refine"):
+        queue.enqueue([path])
+        assert run_worker(queue, Processor(ProcessingConfig()), owner="w", poll_interval=0) == 1
+
+    messages = [record.getMessage() for record in caplog.records if record.name == "subs_refine.jobqueue"]
+    assert messages == ["[w] Lost the lease on ep00.srt (attempt 1), leaving it to the new owner",
+                        "[w] Done: ep00.srt (attempt 2)"]
+    assert len(calls) == 2
@@ -0,0 +1,44 @@
+import pytest
+
+from subs_refine import ProcessingConfig, Subtitle
+from subs_refine.config import OutputFormat, OutputSettings, RecurringAction, RecurringBlocks
+from subs_refine.recurring import RecurringIndex, mark_recurring
+from subs_refine.subtitle import Dialog, Events, Timecode
+
+SONG = ("光の中へ", "走り出そう", "君と二人", "どこまでも", "夢を見て")
+
+
+def make_doc(lines: list[tuple[int, int, str]]) -> Subtitle:
+    doc = Subtitle()
+    doc.events = Events(Dialog(Timecode(start), Timecode(end), text) for start, end, text in lines)
+    return doc
+
+
+def test_ranges_of_out_of_order_events_are_merged():
+    index = RecurringIndex.build([make_doc([(i * 1000, i * 1000 + 900, line) for i, line in enumerate(SONG)])] * 3,
+                                 min_lines=2, min_files=3)
+    # The song's second half was muxed first, so its runs come out of time order
+    doc = make_doc([
+        (5000, 5500, "君と二人"), (5500, 6000, "どこまでも"),
+        (0, 1000, "光の中へ"), (1000, 10000, "走り出そう"),
+        (20000, 21000, "別の話"),
+    ])
+
+    ranges = index.ranges(doc)
+    assert ranges == [(0, 10000)]  # Not (0, 10000) followed by (5000, 6000)
+
+    # Midpoint 8000 lies in the first run only; it must not be missed after sorting
+    probe = make_doc([(7000, 9000, "何か"), (20000, 21000, "別の話")])
+    assert mark_recurring(probe, ranges, drop=True) == 1
+    assert [event.text for event in probe.events] == ["別の話"]
+
+
+@pytest.mark.parametrize("output_format", [OutputFormat.TXT, OutputFormat.SRT])
+def test_tag_is_rejected_for_formats_without_styles(output_format):
+    with pytest.raises(ValueError, match="has no effect"):
+        ProcessingConfig(output=OutputSettings(format=output_format),
+                         recurring=RecurringBlocks(action=RecurringAction.TAG))
+    ProcessingConfig(output=OutputSettings(format=output_format),
+                     recurring=RecurringBlocks(action=RecurringAction.DROP))
+    ProcessingConfig(output=OutputSettings(format=OutputFormat.ASS),
+                     recurring=RecurringBlocks(action=RecurringAction.TAG))
@@ -0,0 +1,49 @@
+import pytest
+
+from subs_refine.config import Mapping
+from subs_refine.regex_rules import find_backtracking_risk
+
+
+@pytest.mark.parametrize("pattern", [
+    r"(a+)+b",
+    r"(\w+\s?)*$",
+    r"(a|ab)*c",
+    r"(?:[^\"]|\\.)*\"",  # The negated class also matches the backslash
+    r"(?:[^\d]|a)*x",
+    r"(?:[a-z]|[^0-9])+!",
+    r"(?:\dx|1y)*z",
+    r"(?:\dx|٣y)*z",  # \d also matches other scripts' digits
+    r"(?:\wx|éy)*z",
+    r"(?:[^\d]x|ay)*z",
+    r"(?:a{2}b|ac)*",
+    r"(?:a?b|b)*",
+    r"(?:x*a|a)*",
+    r"(a|)*b",
+])
+def test_catastrophic_shapes_are_flagged(pattern):
+    assert find_backtracking_risk(pattern) is not None
+
+
+@pytest.mark.parametrize("pattern", [
+    r"(?:[^\"\\]|\\.)*\"",  # Quoted string with escapes: the branches start with disjoint characters
+    r"(?:[^\"\\]|\\[\"\\n])*\"",
+    r"(?:[^<]|<b>)*</b>",
+    r"(a|b)*c",
+    r"（[^）]*）",
+    r"(?>a+)+b",
+    r"(?:\dx|ay)*z",
+    r"(?:\wx|-y)*z",
+    r"(?:\sx|\Sy)*z",
+    r"(?:[^\d]x|5y)*z",
+    r"(?a:\dx|٣y)*z",  # Only ASCII digits with the ASCII flag
+    r"(?:a?b|cd)*",
+    r"(?:a{2}b|cd)*",
+])
+def test_safe_shapes_are_not_flagged(pattern):
+    assert find_backtracking_risk(pattern) is None
+
+
+def test_unsafe_mapping_is_rejected_unless_allowed():
+    with pytest.raises(ValueError, match="Unsafe regex mapping"):
+        Mapping(regex={"(a+)+b": ""})
+    assert Mapping(regex={"(a+)+b": ""}, reject_unsafe_regex=False).regex == {"(a+)+b": ""}
@@ -0,0 +1,74 @@
+import sys
+import types
+
+import pytest
+
+from subs_refine import ProcessingConfig, Processor
+from subs_refine.processor import SubtitleType
+from subs_refine.stages import STAGES, Stage, get_stage, register_stage
+
+
+def test_stage_without_apply_is_rejected_at_registration():
+    with pytest.raises(ValueError, match="does not implement apply"):
+        @register_stage
+        class Incomplete(Stage):
+            name = "incomplete"
+
+            def compile(self, config):
+                self.active = True
+
+    assert "incomplete" not in STAGES
+
+
+def test_stage_without_apply_is_rejected_at_load(monkeypatch):
+    module = types.ModuleType("custom_stages")
+
+    class Typo(Stage):
+        name = "typo"
+
+        def aply(self, text):
+            return text
+
+    class Upper(Stage):
+        name = "upper"
+
+        def apply(self, text):
+            return text.upper()
+
+    module.Typo, module.Upper = Typo, Upper
+    monkeypatch.setitem(sys.modules, "custom_stages", module)
+
+    with pytest.raises(ValueError, match="does not implement apply"):
+        get_stage("custom_stages:Typo")
+    assert get_stage("custom_stages:Upper")().apply("abc") == "ABC"
+
+
+WEB_SRT = ("1\n00:00:01,000 --> 00:00:02,000\n<i>今日は</i>いい天気\n\n"
+           "2\n00:00:02,000 --> 00:00:03,000\n今日はいい天気\n\n"
+           "3\n00:00:04,000 --> 00:00:05,000\n- 行くぞ！　- 待って\n")
+
+
+def test_type_stages_can_be_disabled_and_extended():
+    default = Processor(ProcessingConfig()).process_text(WEB_SRT, "srt")
+    assert default.splitlines() == ["今日はいい天気", "行くぞ！", "待って"]
+
+    config = ProcessingConfig()
+    config.type_stages["web"] = ["full_half", "web_split", "interjections"]
+    assert Processor(config).process_text(WEB_SRT, "srt").splitlines() == [
+        "今日はいい天気", "今日はいい天気", "行くぞ！", "待って"]
+
+    config.type_stages["web"] = ["full_half", "web_split", "custom_stages:Upper"]
+    with pytest.raises(ValueError, match="Cannot load stage"):
+        Processor(config)
+
+
+def test_type_stages_split_at_last_non_local_order_dependent_stage():
+    passes = Processor(ProcessingConfig()).passes
+    assert passes[SubtitleType.TV_ASS].names[:passes[SubtitleType.TV_ASS].split] == (
+        "rubi", "full_half_tv_ass", "tv_markers", "speakers")
+    assert passes[SubtitleType.WEB].split == 0  # web_duplicates is local
+
+    config = ProcessingConfig()
+    config.type_stages["web"] = ["full_half", "web_split", "deduplication", "web_duplicates"]
+    config.deduplication.enabled = True
+    assert Processor(config).passes[SubtitleType.WEB].split == 3